@@ -1,10 +1,19 @@
 from component import (DescriptionComponent, Direction, FloorComponent,
-                       InventoryComponent, OnComponent, PortalComponent,
-                       TakeableComponent, WorldDescriptionComponent)
-from core import Action, Entity, EntitySpec, World
+                       InventoryComponent, LandmarkComponent, OnComponent,
+                       PortalComponent, TakeableComponent,
+                       WorldDescriptionComponent)
+from core import Action, ContainerComponent, Entity, EntitySpec, World
+from journal import Journal
+from render import render_cache
+from travel import ExitIndex, room_graph
 from util import Query
 
 
+def rewind_last(world: World, action: Action) -> bool:
+    journal = world.find_listener(Journal)
+    return journal is not None and journal.rewind(action)
+
+
 class TakeAction(Action):
 
     @staticmethod
@@ -13,17 +22,15 @@ class TakeAction(Action):
 
     def apply(self, world: World, entities: list[Entity]):
         entity, = entities
-        if entity in world.player[InventoryComponent].items:
-            print('You are already carrying that.')
+        if entity in world.items(world.player[InventoryComponent]):
+            world.output.write('You are already carrying that.')
             return
-        world.player[InventoryComponent].items.append(entity)
-        for on_component in world.iter_components(OnComponent):
-            if entity in on_component.items:
-                on_component.items.remove(entity)
-        print(f'You take {entity[DescriptionComponent].describe_the()}')
+        world.move_entity(entity, world.player, InventoryComponent)
+        world.output.write(
+            f'You take {entity[DescriptionComponent].describe_the()}')
 
     def rewind(self, world: World):
-        raise NotImplementedError()
+        return rewind_last(world, self)
 
 
 class DefaultTakeAction(Action):
@@ -33,7 +40,7 @@ class DefaultTakeAction(Action):
         return EntitySpec(required=(DescriptionComponent, )),
 
     def apply(self, world: World, entities: list[Entity]):
-        print('You cannot take that.')
+        world.output.write('You cannot take that.')
 
     def rewind(self, world: World):
         pass
@@ -47,21 +54,32 @@ class ExamineAction(Action):
 
     def apply(self, world: World, entities: list[Entity]):
         entity, = entities
+        world.output.write(
+            render_cache(world).render((ExamineAction, entity),
+                                       lambda: self.render(world, entity)))
+
+    @staticmethod
+    def render(world: World,
+               entity: Entity) -> tuple[str, list[ContainerComponent]]:
         description = entity[DescriptionComponent].description
+        containers = []
         if OnComponent in entity:
-            items_on = entity[OnComponent].items
+            containers.append(entity[OnComponent])
+            items_on = world.items(entity[OnComponent])
         else:
-            items_on = set()
+            items_on = {}
 
+        lines = []
         if description is not None:
-            print(description)
+            lines.append(description)
         if description is None and len(items_on) == 0:
-            print("It doesn't look like anything to you.")
+            lines.append("It doesn't look like anything to you.")
         if items_on:
             item_names = ', '.join(item[DescriptionComponent].describe_a()
                                    for item in items_on)
-            print(f'{entity[DescriptionComponent].describe_the()} contains:'
-                  f' {item_names}')
+            lines.append(f'{entity[DescriptionComponent].describe_the()}'
+                         f' contains: {item_names}')
+        return '\n'.join(lines), containers
 
     def rewind(self, world: World):
         pass
@@ -74,7 +92,7 @@ class DefaultExamineAction(Action):
         return EntitySpec(required=()),
 
     def apply(self, world: World, entities: list[Entity]):
-        print("It doesn't look like anything to you.")
+        world.output.write("It doesn't look like anything to you.")
 
     def rewind(self, world: World):
         pass
@@ -89,24 +107,25 @@ class PutOnAction(Action):
 
     def apply(self, world: World, entities: list[Entity]):
         subject, object_ = entities
-        if subject not in world.player[InventoryComponent].items:
-            print('You are not carrying that.')
+        if subject not in world.items(world.player[InventoryComponent]):
+            world.output.write('You are not carrying that.')
             return
         if subject == object_:
-            print('That is less possible than you might expect.')
+            world.output.write('That is less possible than you might expect.')
             return
         if OnComponent not in object_:
-            print('You cannot put anything on '
-                  f'{object_[DescriptionComponent].describe_the()}')
+            world.output.write(
+                'You cannot put anything on '
+                f'{object_[DescriptionComponent].describe_the()}')
             return
 
-        world.player[InventoryComponent].items.remove(subject)
-        object_[OnComponent].items.add(subject)
-        print(f'You put {subject[DescriptionComponent].describe_the()} on '
-              f'{object_[DescriptionComponent].describe_the()}.')
+        world.move_entity(subject, object_, OnComponent)
+        world.output.write(
+            f'You put {subject[DescriptionComponent].describe_the()} on '
+            f'{object_[DescriptionComponent].describe_the()}.')
 
     def rewind(self, world: World):
-        raise NotImplementedError()
+        return rewind_last(world, self)
 
 
 class DropAction(Action):
@@ -124,7 +143,7 @@ class DropAction(Action):
         return self.put_action.apply(world, [subject, floor])
 
     def rewind(self, world: World):
-        return self.put_action.rewind(world)
+        return rewind_last(world, self)
 
 
 class InventoryAction(Action):
@@ -134,13 +153,20 @@ class InventoryAction(Action):
         return ()
 
     def apply(self, world: World, entities: list[Entity]):
-        items = world.player[InventoryComponent].items
+        world.output.write(
+            render_cache(world).render(InventoryAction,
+                                       lambda: self.render(world)))
+
+    @staticmethod
+    def render(world: World) -> tuple[str, list[ContainerComponent]]:
+        inventory = world.player[InventoryComponent]
+        items = world.items(inventory)
         if not items:
-            print('Your inventory is empty')
-            return
-        print('Your inventory contains:')
+            return 'Your inventory is empty', [inventory]
+        lines = ['Your inventory contains:']
         for item in items:
-            print(f' - {item[DescriptionComponent].describe_a()}')
+            lines.append(f' - {item[DescriptionComponent].describe_a()}')
+        return '\n'.join(lines), [inventory]
 
     def rewind(self, world: World):
         pass
@@ -153,14 +179,24 @@ class DescribeWorldAction(Action):
         return ()
 
     def apply(self, world: World, entities: list[Entity]):
+        world.output.write(
+            render_cache(world).render(DescribeWorldAction,
+                                       lambda: self.render(world)))
+
+    @staticmethod
+    def render(world: World) -> tuple[str, list[ContainerComponent]]:
         component = next(world.iter_components(WorldDescriptionComponent))
-        print(component.description)
+        lines = [component.description]
 
+        containers = []
         floors = Query(world).has(OnComponent).has(FloorComponent).all()
         for floor in floors:
-            for entity in floor[OnComponent].items:
-                print(f'There is {entity[DescriptionComponent].describe_a()}'
-                      ' here.')
+            containers.append(floor[OnComponent])
+            for entity in world.items(floor[OnComponent]):
+                lines.append('There is'
+                             f' {entity[DescriptionComponent].describe_a()}'
+                             ' here.')
+        return '\n'.join(lines), containers
 
     def rewind(self, world: World):
         pass
@@ -177,17 +213,16 @@ class MoveAction(Action):
         return ()
 
     def apply(self, world: World, entities: list[Entity]):
-        found_portal = False
-        for portal in world.iter_components(PortalComponent):
-            if portal.direction == self.direction:
-                found_portal = True
-                world.set_room(portal.room)
+        for index in world.iter_indices():
+            room = index.listener(ExitIndex).exit(self.direction)
+            if room is not None:
+                world.set_room(room)
+                return
 
-        if not found_portal:
-            print('You cannot go that way.')
+        world.output.write('You cannot go that way.')
 
     def rewind(self, world: World):
-        raise NotImplementedError()
+        return rewind_last(world, self)
 
 
 class EnterAction(Action):
@@ -201,7 +236,7 @@ class EnterAction(Action):
         world.set_room(portal[PortalComponent].room)
 
     def rewind(self, world: World):
-        raise NotImplementedError()
+        return rewind_last(world, self)
 
 
 class DefaultEnterAction(Action):
@@ -213,7 +248,107 @@ class DefaultEnterAction(Action):
     def apply(self, world: World, entities: list[Entity]):
         entity, = entities
         name = entity[DescriptionComponent].describe_the()
-        print(f'You cannot enter {name}.')
+        world.output.write(f'You cannot enter {name}.')
+
+    def rewind(self, world: World):
+        pass
+
+
+class GoToAction(Action):
+    """
+    Travel along the shortest path to a landmark's room, or only the first
+    steps rooms of it.
+    """
+
+    def __init__(self, steps: int | None = None):
+        super().__init__()
+        self.steps = steps
+
+    @staticmethod
+    def prerequisites() -> tuple[EntitySpec, ...]:
+        return EntitySpec(required=(LandmarkComponent, )),
+
+    def apply(self, world: World, entities: list[Entity]):
+        landmark, = entities
+        destination = landmark[LandmarkComponent].room
+        if world.current_room is destination:
+            world.output.write('You are already there.')
+            return
+        path = room_graph(world).path(world.current_room, destination)
+        if path is None:
+            world.output.write('You do not know the way there.')
+            return
+        for room in path[:self.steps]:
+            world.set_room(room)
+
+    def with_count(self, count: int) -> Action:
+        return GoToAction(count)
+
+    def rewind(self, world: World):
+        return rewind_last(world, self)
+
+
+class DefaultGoToAction(Action):
+
+    @staticmethod
+    def prerequisites() -> tuple[EntitySpec, ...]:
+        return EntitySpec(required=(DescriptionComponent, )),
+
+    def apply(self, world: World, entities: list[Entity]):
+        entity, = entities
+        name = entity[DescriptionComponent].describe_the()
+        world.output.write(f'You cannot go to {name}.')
+
+    def rewind(self, world: World):
+        pass
+
+
+class WaitAction(Action):
+
+    @staticmethod
+    def prerequisites() -> tuple[EntitySpec, ...]:
+        return ()
+
+    def apply(self, world: World, entities: list[Entity]):
+        world.output.write('Time passes.')
+
+    def rewind(self, world: World):
+        pass
+
+
+class UndoAction(Action):
+
+    duration = 0
+
+    @staticmethod
+    def prerequisites() -> tuple[EntitySpec, ...]:
+        return ()
+
+    def apply(self, world: World, entities: list[Entity]):
+        journal = world.find_listener(Journal)
+        if journal is None or not journal.undo():
+            world.output.write('There is nothing to undo.')
+            return
+        world.output.write('Undone.')
+
+    def rewind(self, world: World):
+        pass
+
+
+class RedoAction(Action):
+
+    duration = 0
+
+    @staticmethod
+    def prerequisites() -> tuple[EntitySpec, ...]:
+        return ()
+
+    def apply(self, world: World, entities: list[Entity]):
+        journal = world.find_listener(Journal)
+        if journal is None or not journal.redo():
+            world.output.write('There is nothing to redo.')
+            return
+        world.output.write('Redone.')
 
     def rewind(self, world: World):
         pass
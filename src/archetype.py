@@ -0,0 +1,198 @@
+from typing import Iterator, Type, TypeVar
+
+from core import (Entity, EntityComponent, EntityIndex, component_mask,
+                  index_versions)
+
+
+class Archetype:
+    """
+    Table of all entities sharing one set of component types, with the
+    component data stored column-wise.
+    """
+
+    def __init__(self, signature: frozenset[int]):
+        self.signature = signature
+        self.mask = sum(1 << key for key in signature)
+        self.entities: list[ArchetypeEntity] = []
+        self.columns: dict[int, list[EntityComponent]] = {
+            key: []
+            for key in signature
+        }
+
+    def __len__(self):
+        return len(self.entities)
+
+    def append(self, entity: 'ArchetypeEntity',
+               components: dict[int, EntityComponent]):
+        entity.archetype = self
+        entity.row = len(self.entities)
+        self.entities.append(entity)
+        for key, column in self.columns.items():
+            column.append(components[key])
+
+    def pop(self, row: int) -> dict[int, EntityComponent]:
+        components = {}
+        for key, column in self.columns.items():
+            components[key] = column[row]
+            column[row] = column[-1]
+            column.pop()
+
+        last = self.entities.pop()
+        if row < len(self.entities):
+            self.entities[row] = last
+            last.row = row
+        return components
+
+
+class ArchetypeEntity(Entity):
+    """
+    Entity whose components live in the columns of an ArchetypeStore. Use
+    ArchetypeStore.spawn to create one.
+    """
+
+    __slots__ = ('store', 'archetype', 'row')
+
+    # pylint: disable-next=super-init-not-called
+    def __init__(self, store: 'ArchetypeStore'):
+        self.store = store
+        self.archetype: Archetype
+        self.row = 0
+        self.observers = []
+
+    T = TypeVar('T', bound=EntityComponent)
+
+    @property
+    def signature(self) -> int:
+        return self.archetype.mask
+
+    @property
+    def components(self) -> dict[int, EntityComponent]:
+        return {
+            key: column[self.row]
+            for key, column in self.archetype.columns.items()
+        }
+
+    def get(self, component_class: Type[T]) -> T | None:
+        column = self.archetype.columns.get(component_class.type_id)
+        if column is None:
+            return None
+        return column[self.row]
+
+    def __getitem__(self, component_class: Type[T]) -> T:
+        return self.archetype.columns[component_class.type_id][self.row]
+
+    def __contains__(self, component_class: Type[T]):
+        return component_class.mask & self.archetype.mask != 0
+
+    def add_component(self, component: EntityComponent):
+        if component.__class__ in self:
+            self.remove_component(component.__class__)
+        components = self.archetype.pop(self.row)
+        components[component.type_id] = component
+        self.store.place(self, components)
+        for observer in self.observers:
+            observer.component_added(self, component)
+
+    def remove_component(self, component_class: Type[T]) -> T:
+        components = self.archetype.pop(self.row)
+        component = components.pop(component_class.type_id)
+        self.store.place(self, components)
+        for observer in self.observers:
+            observer.component_removed(self, component)
+        return component
+
+
+class ArchetypeStore(EntityIndex):
+    """
+    EntityIndex that stores its entities in per-archetype tables, so that
+    queries match whole archetypes at once instead of testing entities one
+    by one. Pass one to Room to use it as the room's storage backend.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.archetypes: dict[frozenset[int], Archetype] = {}
+        self.query_cache: dict[int, list[Archetype]] = {}
+
+    def spawn(self, components: list[EntityComponent]) -> ArchetypeEntity:
+        entity = ArchetypeEntity(self)
+        self.entities[entity] = None
+        self.version = next(index_versions)
+        entity.observers.append(self)
+        self.place(entity,
+                   {component.type_id: component
+                    for component in components})
+        for listener in self.listeners:
+            listener.entity_added(entity)
+        return entity
+
+    def place(self, entity: ArchetypeEntity,
+              components: dict[int, EntityComponent]):
+        signature = frozenset(components)
+        if entity not in self.entities:
+            # Detached entities keep their components in a private table
+            Archetype(signature).append(entity, components)
+            return
+
+        archetype = self.archetypes.get(signature)
+        if archetype is None:
+            archetype = self.archetypes[signature] = Archetype(signature)
+            self.query_cache.clear()
+        archetype.append(entity, components)
+
+    def add(self, entity: Entity):
+        if not isinstance(entity, ArchetypeEntity) or entity.store is not self:
+            raise ValueError('Entity was not spawned by this store')
+        if entity in self.entities:
+            return
+        components = entity.archetype.pop(entity.row)
+        self.entities[entity] = None
+        self.version = next(index_versions)
+        entity.observers.append(self)
+        self.place(entity, components)
+        for listener in self.listeners:
+            listener.entity_added(entity)
+
+    def remove(self, entity: Entity):
+        assert isinstance(entity, ArchetypeEntity)
+        components = entity.archetype.pop(entity.row)
+        del self.entities[entity]
+        self.version = next(index_versions)
+        entity.observers.remove(self)
+        self.place(entity, components)
+        for listener in self.listeners:
+            listener.entity_removed(entity)
+
+    def index_component(self, entity: Entity, component: EntityComponent):
+        pass
+
+    def unindex_component(self, entity: Entity, component: EntityComponent):
+        pass
+
+    def matching_archetypes(self, mask: int) -> list[Archetype]:
+        archetypes = self.query_cache.get(mask)
+        if archetypes is None:
+            archetypes = self.query_cache[mask] = [
+                archetype for archetype in self.archetypes.values()
+                if archetype.mask & mask == mask
+            ]
+        return archetypes
+
+    def with_component(self,
+                       component_class: Type[EntityComponent]) -> list[Entity]:
+        entities: list[Entity] = []
+        for archetype in self.matching_archetypes(component_class.mask):
+            entities.extend(archetype.entities)
+        return entities
+
+    def count(self, component_class: Type[EntityComponent]) -> int:
+        return sum(
+            len(archetype)
+            for archetype in self.matching_archetypes(component_class.mask))
+
+    def matching(
+            self, component_classes: list[Type[EntityComponent]]
+    ) -> Iterator[Entity]:
+        mask = component_mask(component_classes)
+        for archetype in self.matching_archetypes(mask):
+            yield from list(archetype.entities)
@@ -0,0 +1,113 @@
+import array
+from typing import Sequence
+
+from core import World
+from output import CollectingSink
+from session import Session
+from util import (Candidate, CommandDispatcher, CommandInterpretationError,
+                  interpret_candidates)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def group_by_room(rooms: Sequence[int],
+                  commands: Sequence[int]) -> list[list[int]]:
+    """
+    Positions of the batch grouped by (room, command) pair, each group in
+    increasing order.
+    """
+    if numpy is not None and len(rooms) > 0:
+        keys = (numpy.asarray(rooms, dtype=numpy.int64) * (max(commands) + 1) +
+                numpy.asarray(commands))
+        _, inverse = numpy.unique(keys, return_inverse=True)
+        order = numpy.argsort(inverse, kind='stable')
+        bounds = numpy.flatnonzero(numpy.diff(inverse[order])) + 1
+        return [group.tolist() for group in numpy.split(order, bounds)]
+
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i, key in enumerate(zip(rooms, commands)):
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
+
+
+class BatchEnvironment:
+    """
+    Plays many games in lockstep, one command per game per step, e.g. for
+    bots. The worlds must be instances of one world (see World.instantiate),
+    so that they share rooms and entities: interpreting a command then only
+    depends on the current room, and is done once per distinct command and
+    room in the batch, after matching each distinct command string once.
+    Actions are applied to each world in turn. The current rooms are kept
+    in an array (a NumPy one if NumPy is installed) to group the batch.
+    """
+
+    def __init__(self, worlds: list[World], dispatcher: CommandDispatcher):
+        for world in worlds:
+            if world.global_entities is not worlds[0].global_entities:
+                raise ValueError('Batched worlds must be instances of one '
+                                 'world')
+        self.sinks = [CollectingSink() for _ in worlds]
+        self.sessions = []
+        for world, sink in zip(worlds, self.sinks):
+            world.output = sink
+            self.sessions.append(Session(world, dispatcher))
+        self.dispatcher = dispatcher
+        self.room_ids = {
+            room: i
+            for i, room in enumerate(worlds[0].rooms if worlds else ())
+        }
+        if numpy is not None:
+            self.rooms = numpy.zeros(len(worlds), dtype=numpy.int32)
+        else:
+            self.rooms = array.array('l', [0] * len(worlds))
+        self.update_rooms(range(len(worlds)))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def update_rooms(self, positions: Sequence[int]):
+        for i in positions:
+            room = self.sessions[i].world.current_room
+            self.rooms[i] = -1 if room is None else self.room_ids[room]
+
+    def start(self) -> list[str]:
+        """
+        Describe the starting room of every game.
+        """
+        for session in self.sessions:
+            session.start()
+        return [sink.take() for sink in self.sinks]
+
+    def step(self, command_strings: Sequence[str]) -> list[str]:
+        """
+        Run one command in every game, returning the output of each.
+        """
+        if len(command_strings) != len(self.sessions):
+            raise ValueError(f'Expected {len(self.sessions)} commands, got '
+                             f'{len(command_strings)}')
+
+        command_ids: dict[str, int] = {}
+        commands = [
+            command_ids.setdefault(command_string, len(command_ids))
+            for command_string in command_strings
+        ]
+        candidates: dict[int, list[Candidate]] = {}
+        for group in group_by_room(self.rooms, commands):
+            command = commands[group[0]]
+            if command not in candidates:
+                candidates[command] = list(
+                    self.dispatcher.candidates(command_strings[group[0]]))
+            try:
+                action, entities = interpret_candidates(
+                    self.sessions[group[0]].world, candidates[command])
+            except CommandInterpretationError as err:
+                for i in group:
+                    self.sessions[i].reject(err)
+            else:
+                for i in group:
+                    self.sessions[i].perform(action, entities)
+            self.update_rooms(group)
+        return [sink.take() for sink in self.sinks]
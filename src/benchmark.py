@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+import argparse
+import atexit
+import io
+import json
+import logging
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import logzero
+
+from action import (DefaultEnterAction, DefaultExamineAction,
+                    DefaultTakeAction, DescribeWorldAction, DropAction,
+                    EnterAction, ExamineAction, InventoryAction, MoveAction,
+                    PutOnAction, TakeAction, WaitAction)
+from archetype import ArchetypeStore
+from batch import BatchEnvironment
+from command import PatternCommand, compiled_patterns, translated_patterns
+from component import (DescriptionComponent, Direction, FloorComponent,
+                       InventoryComponent, OnComponent, PortalComponent,
+                       TakeableComponent, WorldDescriptionComponent)
+from core import Entity, EntityComponent, EntityIndex, Room, World
+from main import make_command_to_action
+from output import NullSink
+from scheduler import scheduler_of
+from session import Session
+from snapshot import load_snapshot, write_snapshot
+from util import (CommandDispatcher, NameCache, Query, interpret_command,
+                  lookup_entities)
+from worldgen import WorldShape, generate_world
+
+DEFAULT_SIZES = [10, 1_000, 100_000]
+SCHEDULER_TIMERS = 1_000_000
+SCHEDULER_BENCHMARKS = ('scheduler_tick', 'scheduler_advance_1000',
+                        'scheduler_schedule_cancel')
+
+
+@dataclass
+class Benchmark:
+    name: str
+    run: Callable[[], object]
+
+
+@dataclass
+class Result:
+    name: str
+    value: float
+    unit: str
+
+
+def synthetic_world(entities: int,
+                    spawn: Callable[[list[EntityComponent]], Entity] = Entity,
+                    index: EntityIndex | None = None) -> World:
+    """
+    Two connected rooms, the first holding a floor, a table, a door and
+    enough numbered items to make up the given number of entities.
+    """
+    world = World(player=Entity([
+        InventoryComponent(),
+        DescriptionComponent(names=['player']),
+    ]),
+                  output=NullSink())
+    room1 = Room(index)
+    room2 = Room()
+
+    floor_items = []
+    for i in range(max(entities - 4, 1)):
+        components: list[EntityComponent] = [
+            DescriptionComponent(names=[f'item {i}'], description=f'Item {i}')
+        ]
+        if i % 2 == 0:
+            components.append(TakeableComponent())
+        item = spawn(components)
+        room1.add_entity(item)
+        if i % 10 == 0:
+            floor_items.append(item)
+
+    room1.add_entity(
+        spawn([
+            DescriptionComponent(names=['floor']),
+            OnComponent(floor_items),
+            FloorComponent(),
+        ]))
+    room1.add_entity(
+        spawn([DescriptionComponent(names=['table']),
+               OnComponent()]))
+    room1.add_entity(spawn([WorldDescriptionComponent('A room.')]))
+    room1.add_entity(
+        spawn([
+            DescriptionComponent(names=['door']),
+            PortalComponent(room=room2, direction=Direction.E),
+        ]))
+    room2.add_entity(Entity([WorldDescriptionComponent('Another room.')]))
+    room2.add_entity(
+        Entity([
+            DescriptionComponent(names=['door']),
+            PortalComponent(room=room1, direction=Direction.W),
+        ]))
+
+    world.add_room(room1)
+    world.add_room(room2)
+    world.set_room(room1)
+    return world
+
+
+def command_benchmarks() -> list[Benchmark]:
+    command = PatternCommand('put|place|drop <item> on <item>')
+
+    def construct():
+        translated_patterns.clear()
+        compiled_patterns.clear()
+        return PatternCommand('put|place|drop <item> on <item>')
+
+    return [
+        Benchmark('pattern_command_construction', construct),
+        Benchmark('pattern_command_construction_cached',
+                  lambda: PatternCommand('put|place|drop <item> on <item>')),
+        Benchmark('pattern_command_match',
+                  lambda: command.get_entity_names('put the item 0 on table')),
+    ]
+
+
+def world_benchmarks(world: World) -> list[Benchmark]:
+    dispatcher = CommandDispatcher(make_command_to_action())
+    room = world.current_room
+    item = lookup_entities(world, 'item 0')[0]
+    table = lookup_entities(world, 'table')[0]
+    door = lookup_entities(world, 'door')[0]
+    take, drop, put_on = TakeAction(), DropAction(), PutOnAction()
+    move_east, move_west = MoveAction(Direction.E), MoveAction(Direction.W)
+
+    def take_drop():
+        take.apply(world, [item])
+        drop.apply(world, [item])
+
+    def take_put_on():
+        take.apply(world, [item])
+        put_on.apply(world, [item, table])
+        take.apply(world, [item])
+        drop.apply(world, [item])
+
+    def move():
+        move_east.apply(world, [])
+        move_west.apply(world, [])
+
+    def enter():
+        EnterAction().apply(world, [door])
+        move_west.apply(world, [])
+
+    return [
+        Benchmark(
+            'interpret_command',
+            lambda: interpret_command(world, dispatcher, 'examine item 1')),
+        Benchmark('lookup_entities', lambda: lookup_entities(world, 'item 1')),
+        Benchmark('lookup_entities_cached',
+                  lambda: world.shared(NameCache).lookup(world, 'item 1')),
+        Benchmark(
+            'query_all', lambda: list(
+                Query(world).has(DescriptionComponent).has(TakeableComponent).
+                all())),
+        Benchmark('query_one',
+                  Query(world).has(FloorComponent).one),
+        Benchmark(
+            'component_access', lambda: (item.get(TakeableComponent), item[
+                DescriptionComponent].names, FloorComponent in item)),
+        Benchmark('set_room', lambda: world.set_room(room)),
+        Benchmark('take_drop', take_drop),
+        Benchmark('take_put_on', take_put_on),
+        Benchmark('default_take',
+                  lambda: DefaultTakeAction().apply(world, [table])),
+        Benchmark('examine', lambda: ExamineAction().apply(world, [item])),
+        Benchmark('default_examine',
+                  lambda: DefaultExamineAction().apply(world, [item])),
+        Benchmark('inventory', lambda: InventoryAction().apply(world, [])),
+        Benchmark('describe_world',
+                  lambda: DescribeWorldAction().apply(world, [])),
+        Benchmark('move', move),
+        Benchmark('enter', enter),
+        Benchmark('default_enter',
+                  lambda: DefaultEnterAction().apply(world, [table])),
+    ]
+
+
+def generated_shape(entities: int) -> WorldShape:
+    return WorldShape(rooms=max(1, entities // 100),
+                      entities_per_room=min(entities, 100))
+
+
+def generated_benchmarks(world: World) -> list[Benchmark]:
+    session = Session(world, CommandDispatcher(make_command_to_action()))
+
+    def move():
+        session.run('go east')
+        session.run('go west')
+
+    far_room = f'room {len(world.rooms) - 1}'
+
+    def go_to():
+        session.run(f'go to {far_room}')
+        session.run('go to room 0')
+
+    batch = BatchEnvironment([world.instantiate() for _ in range(100)],
+                             session.dispatcher)
+    batch_commands = [('go east', 'go west', 'look', 'take key')[i % 4]
+                      for i in range(len(batch))]
+
+    return [
+        Benchmark('generated_look', lambda: session.run('look')),
+        Benchmark('generated_batch_step_100',
+                  lambda: batch.step(batch_commands)),
+        Benchmark('generated_go_to', go_to),
+        Benchmark('generated_examine_floor',
+                  lambda: session.run('examine floor')),
+        Benchmark('generated_move', move),
+    ] + snapshot_benchmarks(world)
+
+
+def snapshot_benchmarks(world: World) -> list[Benchmark]:
+    with tempfile.NamedTemporaryFile(suffix='.snap', delete=False) as file:
+        write_snapshot(world, file)
+    path = Path(file.name)
+    atexit.register(path.unlink)
+
+    return [
+        Benchmark('snapshot_save',
+                  lambda: write_snapshot(world, io.BytesIO())),
+        Benchmark('snapshot_load', lambda: load_snapshot(path)),
+    ]
+
+
+def scheduler_benchmarks(timers: int) -> list[Benchmark]:
+    """
+    Scheduler holding the given number of pending timers, due at random
+    ticks up to that number and each repeating with that period, so that
+    about one timer falls due per tick.
+    """
+    world = synthetic_world(10)
+    scheduler = scheduler_of(world)
+    action = WaitAction()
+    rng = random.Random(0)
+    for _ in range(timers):
+        scheduler.schedule(rng.randrange(1, timers + 1), action, period=timers)
+
+    def schedule_cancel():
+        scheduler.cancel(scheduler.schedule(rng.randrange(timers), action))
+
+    return [
+        Benchmark('scheduler_tick', scheduler.advance),
+        Benchmark('scheduler_advance_1000', lambda: scheduler.advance(1000)),
+        Benchmark('scheduler_schedule_cancel', schedule_cancel),
+    ]
+
+
+def time_benchmark(benchmark: Benchmark, min_time: float) -> float:
+    """
+    Best time per call over several rounds, each calibrated to last at least
+    a hundredth of min_time.
+    """
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            benchmark.run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 100:
+            break
+        iterations *= 10
+
+    best = elapsed / iterations
+    deadline = time.perf_counter() + min_time
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            benchmark.run()
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return best
+
+
+def memory_per_entity(build: Callable[[], World], entities: int) -> float:
+    tracemalloc.start()
+    world = build()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del world
+    return memory / entities
+
+
+def memory_per_session(new_world: Callable[[], World],
+                       sessions: int = 10) -> float:
+    """
+    Memory held by each of several live sessions that have taken an item and
+    moved between rooms.
+    """
+    dispatcher = CommandDispatcher(make_command_to_action())
+    tracemalloc.start()
+    live = []
+    for _ in range(sessions):
+        world = new_world()
+        world.output = NullSink()
+        session = Session(world, dispatcher)
+        for command in ('take coin', 'go east', 'look', 'go west'):
+            session.run(command)
+        live.append(session)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return memory / sessions
+
+
+def archetype_world(entities: int) -> World:
+    store = ArchetypeStore()
+    return synthetic_world(entities, store.spawn, store)
+
+
+def memory_benchmarks(size: int) -> dict[str, Callable[[], float]]:
+    shape = generated_shape(size)
+    return {
+        'memory_per_entity':
+        lambda: memory_per_entity(lambda: synthetic_world(size), size),
+        'memory_per_entity_archetype':
+        lambda: memory_per_entity(lambda: archetype_world(size), size),
+        'memory_per_session':
+        lambda: memory_per_session(lambda: generate_world(shape)),
+        'memory_per_session_shared':
+        lambda: memory_per_session(generate_world(shape).instantiate),
+    }
+
+
+def run_suite(sizes: list[int], keyword: str, min_time: float,
+              report: Callable[[Result], None]) -> list[Result]:
+    results = []
+
+    def record(name: str, value: float, unit: str):
+        result = Result(name, value, unit)
+        results.append(result)
+        report(result)
+
+    def run(benchmarks: list[Benchmark], suffix: str = ''):
+        for benchmark in benchmarks:
+            if keyword in benchmark.name:
+                record(f'{benchmark.name}{suffix}',
+                       time_benchmark(benchmark, min_time), 's')
+
+    run(command_benchmarks())
+    if any(keyword in name for name in SCHEDULER_BENCHMARKS):
+        run(scheduler_benchmarks(SCHEDULER_TIMERS), f'[{SCHEDULER_TIMERS}]')
+
+    for size in sizes:
+        run(world_benchmarks(synthetic_world(size)), f'[{size}]')
+
+        if keyword in 'query_all_archetype':
+            world = archetype_world(size)
+            benchmark = Benchmark('query_all_archetype',
+                                  lambda world=world: list(
+                                      Query(world).has(DescriptionComponent).
+                                      has(TakeableComponent).all()))
+            record(f'{benchmark.name}[{size}]',
+                   time_benchmark(benchmark, min_time), 's')
+
+        for name, measure in memory_benchmarks(size).items():
+            if keyword in name:
+                record(f'{name}[{size}]', measure(), 'B')
+
+        shape = generated_shape(size)
+        if keyword in 'generate_world':
+            start = time.perf_counter()
+            generate_world(shape)
+            record(f'generate_world[{size}]', time.perf_counter() - start, 's')
+        world = generate_world(shape)
+        world.output = NullSink()
+        run(generated_benchmarks(world), f'[{size}]')
+
+    return results
+
+
+def format_result(result: Result) -> str:
+    if result.unit == 's':
+        return f'{result.name:<45} {result.value * 1e6:14.3f} us'
+    return f'{result.name:<45} {result.value:14.1f} {result.unit}'
+
+
+def find_regressions(results: list[Result], baseline: dict,
+                     threshold: float) -> list[str]:
+    regressions = []
+    for result in results:
+        previous = baseline['results'].get(result.name)
+        if previous is None:
+            continue
+        if result.value > previous['value'] * (1 + threshold):
+            regressions.append(
+                f'{result.name}: {previous["value"]:.4g} -> '
+                f'{result.value:.4g} {result.unit}'
+                f' (+{result.value / previous["value"] - 1:.0%})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the parser, entity lookup and actions over '
+        'synthetic and generated worlds of several sizes.')
+    parser.add_argument('--sizes',
+                        type=int,
+                        nargs='+',
+                        default=DEFAULT_SIZES,
+                        help='numbers of entities in the synthetic worlds')
+    parser.add_argument('-k',
+                        '--keyword',
+                        default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time',
+                        type=float,
+                        default=0.2,
+                        help='seconds to spend timing each benchmark')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline',
+                        help='compare against results saved with --json')
+    parser.add_argument('--threshold',
+                        type=float,
+                        default=0.25,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    logzero.loglevel(logging.FATAL)
+    results = run_suite(args.sizes, args.keyword, args.min_time,
+                        lambda result: print(format_result(result)))
+
+    if args.json is not None:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'python': platform.python_version(),
+                    'results': {
+                        result.name: {
+                            'value': result.value,
+                            'unit': result.unit
+                        }
+                        for result in results
+                    },
+                },
+                file,
+                indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
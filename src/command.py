@@ -1,15 +1,126 @@
+import hashlib
+import json
 import re
+from pathlib import Path
 
-from core import Command
+from core import Action, Command
+
+# Compiled regexes keyed by their source, shared by all commands so that
+# matching never goes through the re module's small internal cache
+compiled_patterns: dict[str, re.Pattern[str]] = {}
+
+# PatternCommand syntax mapped to the translated regex and leading words
+translated_patterns: dict[str, tuple[str, list[str] | None]] = {}
+
+
+def compile_pattern(pattern: str | re.Pattern[str]) -> re.Pattern[str]:
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    compiled = compiled_patterns.get(pattern)
+    if compiled is None:
+        compiled = compiled_patterns[pattern] = re.compile(pattern)
+    return compiled
+
+
+def leading_words(pattern: str) -> set[str] | None:
+    if pattern.startswith('['):
+        end = pattern.find(']')
+        if not pattern[1:end].endswith(' '):
+            # An optional prefix of the first word, e.g. [un]lock
+            return None
+        optional = leading_words(pattern[1:end])
+        rest = leading_words(pattern[end + 1:])
+        if optional is None or rest is None:
+            return None
+        return optional | rest
+
+    match = re.match(r'[\w|]+(?= |$)', pattern)
+    if match is None:
+        return None
+    words = {
+        alternative.split('_')[0]
+        for alternative in match.group().split('|')
+    }
+    if '' in words:
+        return None
+    return words
+
+
+# Rewrites turning PatternCommand syntax into a regex, applied in order
+TRANSLATION_RULES: tuple[tuple[str, str], ...] = (
+    (r'<item>', r'(?:the )?(\\w+(?: \\w+)?)'),
+    (r'\b((\w+\|)+(\w+))\b', r'(?:\1)'),
+    (r'\[(.*?)\]', r'(?:\1)?'),
+    (r'_', ' '),
+    # After optional parts, since the count's character class has brackets
+    (r'<count>', r'([1-9]\\d*)'),
+)
+
+# Identifies the translation rules, so that a cache written with other rules
+# is never used
+TRANSLATOR_KEY = hashlib.sha256(repr(TRANSLATION_RULES).encode()).hexdigest()
+
+
+def translate_pattern(pattern: str) -> tuple[str, list[str] | None]:
+    translated = translated_patterns.get(pattern)
+    if translated is not None:
+        return translated
+
+    regex = pattern
+    for rule, replacement in TRANSLATION_RULES:
+        regex = re.sub(rule, replacement, regex)
+    return remember_translation(pattern, regex)
+
+
+def remember_translation(pattern: str,
+                         regex: str) -> tuple[str, list[str] | None]:
+    words = leading_words(pattern)
+    translated = regex, None if words is None else sorted(words)
+    translated_patterns[pattern] = translated
+    return translated
+
+
+def load_pattern_cache(path: Path):
+    """
+    Load translated PatternCommand syntax saved by save_pattern_cache. A
+    missing, unreadable or invalid cache, or one written with other
+    translation rules, is ignored.
+    """
+    try:
+        with path.open(encoding='utf-8') as file:
+            cache = json.load(file)
+        if cache['translator'] != TRANSLATOR_KEY:
+            return
+        if not isinstance(cache['patterns'], dict):
+            raise TypeError('Cached patterns must be an object')
+        for regex in cache['patterns'].values():
+            compile_pattern(regex)
+    except (OSError, KeyError, TypeError, ValueError, re.error):
+        return
+    for pattern, regex in cache['patterns'].items():
+        if pattern not in translated_patterns:
+            remember_translation(pattern, regex)
+
+
+def save_pattern_cache(path: Path):
+    with path.open('w', encoding='utf-8') as file:
+        json.dump(
+            {
+                'translator': TRANSLATOR_KEY,
+                'patterns': {
+                    pattern: regex
+                    for pattern, (regex, _) in translated_patterns.items()
+                },
+            }, file)
 
 
 class RegexCommand(Command):
 
     def __init__(self, pattern: str | re.Pattern[str]):
-        self.pattern = pattern
+        self.pattern = compile_pattern(pattern)
 
     def get_entity_names(self, command_string: str) -> list[str] | None:
-        match = re.fullmatch(self.pattern, command_string)
+        match = self.pattern.fullmatch(command_string)
         if match is None:
             return None
 
@@ -22,14 +133,29 @@ class PatternCommand(Command):
 
         put|place|drop <item> on <item>
         [move|go ]north|n
+        travel <count> steps to <item>
     """
 
     def __init__(self, pattern: str):
-        pattern = pattern.replace('<item>', r'(?:the )?(\w+(?: \w+)?)')
-        pattern = re.sub(r'\b((\w+\|)+(\w+))\b', r'(?:\1)', pattern)
-        pattern = re.sub(r'\[(.*?)\]', r'(?:\1)?', pattern)
-        pattern = pattern.replace('_', ' ')
-        self.command = RegexCommand(pattern)
+        regex, words = translate_pattern(pattern)
+        self.syntax = pattern
+        self.leading_words = None if words is None else set(words)
+        self.command = RegexCommand(regex)
 
     def get_entity_names(self, command_string: str) -> list[str] | None:
         return self.command.get_entity_names(command_string)
+
+    def verbs(self) -> set[str] | None:
+        return self.leading_words
+
+
+class CountCommand(PatternCommand):
+    """
+    PatternCommand starting with a <count>, which is given to the action
+    instead of being resolved as an entity name.
+    """
+
+    def bind(self, action: Action,
+             names: list[str]) -> tuple[Action, list[str]]:
+        count, *entity_names = names
+        return action.with_count(int(count)), entity_names
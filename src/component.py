@@ -1,11 +1,13 @@
 import re
 from enum import Enum
 
-from core import Entity, EntityComponent, Room
+from core import ContainerComponent, EntityComponent, Room
 
 
 class DescriptionComponent(EntityComponent):
 
+    __slots__ = ('names', 'description')
+
     def __init__(self, names: list[str], description: str | None = None):
         self.names = names
         self.description = description
@@ -35,28 +37,26 @@ class DescriptionComponent(EntityComponent):
 
 class WorldDescriptionComponent(EntityComponent):
 
+    __slots__ = ('description', )
+
     def __init__(self, description: str):
         self.description = description
 
 
-class InventoryComponent(EntityComponent):
-
-    def __init__(self):
-        self.items: list[Entity] = []
+class InventoryComponent(ContainerComponent):
+    __slots__ = ()
 
 
-class OnComponent(EntityComponent):
-
-    def __init__(self, items: set[Entity] | None = None):
-        self.items = items or set()
+class OnComponent(ContainerComponent):
+    __slots__ = ()
 
 
 class TakeableComponent(EntityComponent):
-    pass
+    __slots__ = ()
 
 
 class FloorComponent(EntityComponent):
-    pass
+    __slots__ = ()
 
 
 class Direction(Enum):
@@ -75,6 +75,20 @@ class Direction(Enum):
 
 class PortalComponent(EntityComponent):
 
+    __slots__ = ('room', 'direction')
+
     def __init__(self, room: Room, direction: Direction):
         self.room = room
         self.direction = direction
+
+
+class LandmarkComponent(EntityComponent):
+    """
+    Marks a global entity naming a room, so that commands can refer to rooms
+    other than the current one.
+    """
+
+    __slots__ = ('room', )
+
+    def __init__(self, room: Room):
+        self.room = room
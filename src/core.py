@@ -1,69 +1,521 @@
+import copy
+import itertools
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Type, TypeVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, ClassVar, Iterable, Iterator, Type, TypeVar
+
+from output import OutputSink, StreamSink
 
 
 class EntityComponent(ABC):
-    pass
+    """
+    Base class of components. Each subclass is numbered with a type_id when
+    it is defined; entities and indices key components by it, and its mask
+    is the bit for it in entity signatures. Subclasses should declare
+    __slots__.
+    """
+
+    __slots__ = ()
+    type_id: ClassVar[int] = -1
+    mask: ClassVar[int] = 0
+    types: ClassVar[list[type['EntityComponent']]] = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.type_id = len(EntityComponent.types)
+        cls.mask = 1 << cls.type_id
+        EntityComponent.types.append(cls)
+
+
+def component_mask(component_classes: Iterable[Type[EntityComponent]]) -> int:
+    mask = 0
+    for component_class in component_classes:
+        mask |= component_class.mask
+    return mask
+
+
+# Signatures are interned, so that entities with the same component types
+# share one int object
+signatures: dict[int, int] = {}
 
 
 class Entity:
+    """
+    Set of components, at most one of each type. The signature has the mask
+    bit of every component type the entity has.
+    """
+
+    __slots__ = ('components', 'observers', 'signature')
 
     def __init__(self, components: list[EntityComponent]):
         self.components = {
-            component.__class__.__name__: component
+            component.type_id: component
             for component in components
         }
+        self.observers: list[EntityIndex] = []
+        signature = component_mask(map(type, components))
+        self.signature = signatures.setdefault(signature, signature)
 
     T = TypeVar('T', bound=EntityComponent)
 
     def get(self, component_class: Type[T]) -> T | None:
-        return self.components.get(component_class.__name__)
+        return self.components.get(component_class.type_id)
 
     def __getitem__(self, component_class: Type[T]) -> T:
-        return self.components[component_class.__name__]
+        return self.components[component_class.type_id]
 
     def __contains__(self, component_class: Type[T]):
-        return component_class.__name__ in self.components
+        return component_class.type_id in self.components
+
+    def add_component(self, component: EntityComponent):
+        if component.type_id in self.components:
+            self.remove_component(component.__class__)
+        self.components[component.type_id] = component
+        signature = self.signature | component.mask
+        self.signature = signatures.setdefault(signature, signature)
+        for observer in self.observers:
+            observer.component_added(self, component)
+
+    def remove_component(self, component_class: Type[T]) -> T:
+        component = self.components.pop(component_class.type_id)
+        signature = self.signature & ~component.mask
+        self.signature = signatures.setdefault(signature, signature)
+        for observer in self.observers:
+            observer.component_removed(self, component)
+        return component
+
+
+class IndexListener:
+    """
+    Secondary index kept up to date with the contents of an EntityIndex.
+    """
+
+    def entity_added(self, entity: Entity):
+        pass
 
+    def entity_removed(self, entity: Entity):
+        pass
 
-class Room:
+    def component_added(self, entity: Entity, component: EntityComponent):
+        pass
+
+    def component_removed(self, entity: Entity, component: EntityComponent):
+        pass
+
+
+# Versions of entity indices are drawn from one sequence, so that a version
+# identifies the contents of a single index
+index_versions = itertools.count()
+
+
+class EntityIndex:
+    """
+    Insertion-ordered set of entities, indexed by component type so that
+    lookups cost time proportional to the number of matching entities. The
+    version changes whenever an entity or component is added or removed.
+    """
 
     def __init__(self):
-        self.entities: list[Entity] = []
+        self.entities: dict[Entity, None] = {}
+        self.by_component: dict[int, dict[Entity, None]] = {}
+        self.listeners: list[IndexListener] = []
+        self.version = next(index_versions)
+
+    def __iter__(self) -> Iterator[Entity]:
+        return iter(self.entities)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity: Entity):
+        return entity in self.entities
+
+    L = TypeVar('L', bound=IndexListener)
+
+    def listener(self, listener_class: Type[L]) -> L:
+        """
+        Get the listener of the given class, attaching a new one (built with
+        this index as its only argument) if there is none yet.
+        """
+        for listener in self.listeners:
+            if isinstance(listener, listener_class):
+                return listener
+        listener = listener_class(self)
+        self.listeners.append(listener)
+        return listener
+
+    def add(self, entity: Entity):
+        if entity in self.entities:
+            return
+        self.entities[entity] = None
+        self.version = next(index_versions)
+        entity.observers.append(self)
+        for component in entity.components.values():
+            self.index_component(entity, component)
+        for listener in self.listeners:
+            listener.entity_added(entity)
+
+    def remove(self, entity: Entity):
+        del self.entities[entity]
+        self.version = next(index_versions)
+        entity.observers.remove(self)
+        for component in entity.components.values():
+            self.unindex_component(entity, component)
+        for listener in self.listeners:
+            listener.entity_removed(entity)
+
+    def component_added(self, entity: Entity, component: EntityComponent):
+        self.version = next(index_versions)
+        self.index_component(entity, component)
+        for listener in self.listeners:
+            listener.component_added(entity, component)
+
+    def component_removed(self, entity: Entity, component: EntityComponent):
+        self.version = next(index_versions)
+        self.unindex_component(entity, component)
+        for listener in self.listeners:
+            listener.component_removed(entity, component)
+
+    def index_component(self, entity: Entity, component: EntityComponent):
+        self.by_component.setdefault(component.type_id, {})[entity] = None
+
+    def unindex_component(self, entity: Entity, component: EntityComponent):
+        key = component.type_id
+        entities = self.by_component[key]
+        del entities[entity]
+        if not entities:
+            del self.by_component[key]
+
+    def with_component(self,
+                       component_class: Type[EntityComponent]) -> list[Entity]:
+        return list(self.by_component.get(component_class.type_id, ()))
+
+    def count(self, component_class: Type[EntityComponent]) -> int:
+        return len(self.by_component.get(component_class.type_id, ()))
+
+    def matching(
+            self, component_classes: list[Type[EntityComponent]]
+    ) -> Iterator[Entity]:
+        rarest, *rest = sorted(component_classes, key=self.count)
+        mask = component_mask(rest)
+        for entity in self.with_component(rarest):
+            if entity.signature & mask == mask:
+                yield entity
+
+
+class ContainerComponent(EntityComponent):
+    """
+    Base class for components of entities that hold other entities. Items
+    are kept in insertion order; use World.move_entity to move them so that
+    the world's containment index stays up to date.
+    """
+
+    __slots__ = ('items', )
+
+    def __init__(self, items: Iterable[Entity] | None = None):
+        self.items: dict[Entity, None] = dict.fromkeys(items or ())
+
+
+Location = tuple[Entity, ContainerComponent]
+
+
+class ContainmentIndex(IndexListener):
+    """
+    Maps every entity held by a container in an EntityIndex to the container
+    entity and component holding it. Items of other indices, such as global
+    entities in a room, are also reported to the ContainmentIndex of their
+    own index if it has one, so that the location of an entity is found from
+    the indices holding it. Rooms and the global entities of a world always
+    have one.
+    """
+
+    def __init__(self, index: EntityIndex):
+        self.index = index
+        self.locations: dict[Entity, Location] = {}
+        for entity in index:
+            self.entity_added(entity)
+
+    def others(self, item: Entity) -> Iterator['ContainmentIndex']:
+        for index in item.observers:
+            if index is not self.index:
+                for listener in index.listeners:
+                    if isinstance(listener, ContainmentIndex):
+                        yield listener
+
+    def release(self):
+        """Withdraw what was reported to other indices."""
+        for entity in self.index:
+            self.entity_removed(entity)
+
+    def entity_added(self, entity: Entity):
+        for component in entity.components.values():
+            self.component_added(entity, component)
+
+    def entity_removed(self, entity: Entity):
+        for component in entity.components.values():
+            self.component_removed(entity, component)
+
+    def component_added(self, entity: Entity, component: EntityComponent):
+        if isinstance(component, ContainerComponent):
+            for item in component.items:
+                self.locations[item] = entity, component
+                for other in self.others(item):
+                    other.locations[item] = entity, component
+
+    def component_removed(self, entity: Entity, component: EntityComponent):
+        if isinstance(component, ContainerComponent):
+            for item in component.items:
+                for holder in (self, *self.others(item)):
+                    if holder.locations.get(item) == (entity, component):
+                        del holder.locations[item]
+
+
+class Room:
+    """
+    A location in the world. A room may be created empty with a loader that
+    fills it in on first use; World.set_room materializes it. Contents of
+    such a room can be evicted and are loaded again on next use, and the
+    unloader, if any, is called once they are dropped.
+    """
+
+    __slots__ = ('entities', 'loader', 'unloader', 'loaded')
+
+    def __init__(self,
+                 entities: EntityIndex | None = None,
+                 loader: Callable[['Room'], None] | None = None,
+                 unloader: Callable[['Room'], None] | None = None):
+        self.entities = entities if entities is not None else EntityIndex()
+        self.entities.listener(ContainmentIndex)
+        self.loader = loader
+        self.unloader = unloader
+        self.loaded = loader is None
+
+    def materialize(self):
+        if not self.loaded:
+            self.loaded = True
+            self.loader(self)
+
+    def evict(self):
+        assert self.loader is not None
+        self.entities.listener(ContainmentIndex).release()
+        self.entities = type(self.entities)()
+        self.entities.listener(ContainmentIndex)
+        self.loaded = False
+        if self.unloader is not None:
+            self.unloader(self)
 
     def add_entity(self, entity: Entity):
-        self.entities.append(entity)
+        self.entities.add(entity)
 
+    def remove_entity(self, entity: Entity):
+        self.entities.remove(entity)
 
-class World:
 
-    def __init__(self, player: Entity):
+class CurrentEntities:
+    """
+    Live view of the entities in scope: the world's global entities followed
+    by those of the current room. It reflects room changes and added or
+    removed entities without being rebuilt.
+    """
+
+    def __init__(self, world: 'World'):
+        self.world = world
+
+    def __iter__(self) -> Iterator[Entity]:
+        for index in self.world.iter_indices():
+            yield from list(index)
+
+    def __len__(self):
+        return sum(len(index) for index in self.world.iter_indices())
+
+    def __contains__(self, entity: Entity):
+        return any(entity in index for index in self.world.iter_indices())
+
+
+class WorldListener:
+    """
+    Observer of the changes made to a World as the game is played.
+    """
+
+    def entity_moved(self, entity: Entity, source: Location | None,
+                     destination: Location | None):
+        pass
+
+    def room_changed(self, source: Room | None, destination: Room):
+        pass
+
+
+class ContainerOverlay:
+    """
+    Contents of the containers changed by one world, kept apart from the
+    components themselves, with the entity holding each such container, and
+    where the entities moved in them now are.
+    """
+
+    __slots__ = ('contents', 'owners', 'locations')
+
+    def __init__(self):
+        self.contents: dict[ContainerComponent, dict[Entity, None]] = {}
+        self.owners: dict[ContainerComponent, Entity] = {}
+        self.locations: dict[Entity, Location | None] = {}
+
+    def copy(self) -> 'ContainerOverlay':
+        overlay = ContainerOverlay()
+        overlay.contents = {
+            component: dict(items)
+            for component, items in self.contents.items()
+        }
+        overlay.owners = dict(self.owners)
+        overlay.locations = dict(self.locations)
+        return overlay
+
+    def items(self, component: ContainerComponent) -> dict[Entity, None]:
+        return self.contents.get(component, component.items)
+
+    def writable_items(self, location: Location) -> dict[Entity, None]:
+        container, component = location
+        items = self.contents.get(component)
+        if items is None:
+            items = self.contents[component] = dict(component.items)
+            self.owners[component] = container
+        return items
+
+
+# pylint: disable-next=too-many-instance-attributes
+class World:
+    """
+    Rooms and entities, plus the state of one game played in them. Moving
+    entities never changes the containers they are in: the new contents are
+    kept in the world's overlay, so that instances of the same world can
+    share all rooms, entities and components. Read the contents of a
+    container with World.items.
+    """
+
+    def __init__(self, player: Entity, output: OutputSink | None = None):
         self.player = player
-        self.rooms = []
-        self.global_entities = []
+        self.output = output if output is not None else StreamSink()
+        self.rooms: dict[Room, None] = {}
+        self.global_entities = EntityIndex()
+        self.global_entities.add(player)
+        self.global_entities.listener(ContainmentIndex)
         self.current_room = None
-        self.current_entities = [player]
+        self.current_entities = CurrentEntities(self)
+        self.listeners: list[WorldListener] = []
+        self.overlay = ContainerOverlay()
+        self.caches: dict[type, Any] = {}
+
+    def instantiate(self, output: OutputSink | None = None) -> 'World':
+        """
+        A new game in this world, starting from its current state. Only what
+        the new game changes is copied; rooms and entities are shared, so
+        they must not be added or removed while instances are in use.
+        """
+        world = copy.copy(self)
+        world.output = output if output is not None else StreamSink()
+        world.current_entities = CurrentEntities(world)
+        world.listeners = []
+        world.overlay = self.overlay.copy()
+        return world
 
     T = TypeVar('T', bound=EntityComponent)
+    L = TypeVar('L', bound=WorldListener)
+    C = TypeVar('C')
+
+    def shared(self, cache_class: Type[C]) -> C:
+        """
+        Get the cache of the given class, holding data derived from the rooms
+        and entities of this world, creating it (with this world as its only
+        argument) on first use. Instances of the world share their caches.
+        """
+        cache = self.caches.get(cache_class)
+        if cache is None:
+            cache = self.caches[cache_class] = cache_class(self)
+        return cache
+
+    def find_listener(self, listener_class: Type[L]) -> L | None:
+        for listener in self.listeners:
+            if isinstance(listener, listener_class):
+                return listener
+        return None
+
+    def iter_indices(self) -> Iterator[EntityIndex]:
+        yield self.global_entities
+        if self.current_room is not None:
+            yield self.current_room.entities
+
+    def iter_entities(self, component_class: Type[T]) -> Iterator[Entity]:
+        for index in self.iter_indices():
+            yield from index.with_component(component_class)
+
+    def iter_matching(
+            self, component_classes: list[Type[EntityComponent]]
+    ) -> Iterator[Entity]:
+        for index in self.iter_indices():
+            yield from index.matching(component_classes)
 
     def iter_components(self, component_class: Type[T]):
-        for entity in self.current_entities:
-            if component_class in entity:
-                yield entity[component_class]
+        for entity in self.iter_entities(component_class):
+            yield entity[component_class]
+
+    def items(self, component: ContainerComponent) -> dict[Entity, None]:
+        return self.overlay.items(component)
+
+    def location_of(self, entity: Entity) -> Location | None:
+        """
+        Where an entity is, whether or not it is in scope. Global entities
+        held in a room are reported to the global index when the room is
+        loaded, so no room needs to be searched.
+        """
+        if entity in self.overlay.locations:
+            return self.overlay.locations[entity]
+        for index in entity.observers:
+            location = index.listener(ContainmentIndex).locations.get(entity)
+            if location is not None:
+                return location
+        return None
+
+    def container_of(self, entity: Entity) -> Entity | None:
+        location = self.location_of(entity)
+        return None if location is None else location[0]
+
+    def detach(self, entity: Entity) -> Location | None:
+        location = self.location_of(entity)
+        if location is None:
+            return None
+        del self.overlay.writable_items(location)[entity]
+        self.overlay.locations[entity] = None
+        return location
+
+    def remove_from_container(self, entity: Entity):
+        source = self.detach(entity)
+        if source is not None:
+            for listener in self.listeners:
+                listener.entity_moved(entity, source, None)
+
+    def move_entity(self, entity: Entity, container: Entity,
+                    component_class: Type[ContainerComponent]):
+        source = self.detach(entity)
+        component = container[component_class]
+        self.overlay.writable_items((container, component))[entity] = None
+        self.overlay.locations[entity] = container, component
+        for listener in self.listeners:
+            listener.entity_moved(entity, source, (container, component))
 
     def add_entity(self, entity: Entity):
-        self.global_entities.append(entity)
+        self.global_entities.add(entity)
+
+    def remove_entity(self, entity: Entity):
+        self.global_entities.remove(entity)
 
     def add_room(self, room: Room):
-        self.rooms.append(room)
+        self.rooms[room] = None
 
     def set_room(self, room: Room):
         assert room in self.rooms
-        self.current_room = room
-        self.current_entities = [
-            self.player
-        ] + self.current_room.entities + self.global_entities
+        room.materialize()
+        source, self.current_room = self.current_room, room
+        for listener in self.listeners:
+            listener.room_changed(source, room)
 
 
 class Command(ABC):
@@ -72,18 +524,40 @@ class Command(ABC):
     def get_entity_names(self, command_string: str) -> list[str] | None:
         pass
 
+    def verbs(self) -> set[str] | None:
+        """
+        First words of the command strings this command can match, or None
+        if they cannot be determined.
+        """
+        return None
+
+    def bind(self, action: 'Action',
+             names: list[str]) -> tuple['Action', list[str]]:
+        """
+        Action to apply for the names matched in a command string, and the
+        names of the entities to apply it to. By default every name is an
+        entity name.
+        """
+        return action, names
+
 
 @dataclass
 class EntitySpec:
     required: tuple[Type[EntityComponent], ...]
+    mask: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.mask = component_mask(self.required)
 
     def matches(self, entity: Entity):
-        return all(component_class in entity
-                   for component_class in self.required)
+        return entity.signature & self.mask == self.mask
 
 
 class Action(ABC):
 
+    # Ticks of game time that applying the action takes
+    duration = 1
+
     @staticmethod
     @abstractmethod
     def prerequisites() -> tuple[EntitySpec, ...]:
@@ -96,3 +570,11 @@ class Action(ABC):
     @abstractmethod
     def rewind(self, world: World):
         pass
+
+    # pylint: disable-next=unused-argument
+    def with_count(self, count: int) -> 'Action':
+        """
+        Action to apply for a command that gave a count, such as a number of
+        steps. Actions that take no count ignore it.
+        """
+        return self
@@ -0,0 +1,117 @@
+import json
+import time
+from typing import TextIO
+
+# Profiler recording the commands being processed, or None when profiling
+# is off. Instrumented code reads it once and does nothing more if it is
+# None, so probes cost a global lookup when profiling is off.
+# pylint: disable-next=invalid-name
+active: 'Profiler | None' = None
+
+
+class Histogram:
+    """
+    Log-scale histogram of non-negative values: bucket i counts the values
+    whose integer part has i bits, i.e. those in [2 ** (i - 1), 2 ** i).
+    """
+
+    def __init__(self):
+        self.buckets: list[int] = []
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        bucket = int(value).bit_length()
+        if bucket >= len(self.buckets):
+            self.buckets.extend([0] * (bucket + 1 - len(self.buckets)))
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-quantile.
+        """
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(float(2**bucket), self.max)
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'buckets': self.buckets,
+        }
+
+
+class Profiler:
+    """
+    Time spent in each phase of processing a command (in microseconds) and
+    per-command counters, aggregated into histograms over all commands.
+    Phases and counters are accumulated until end_command.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, Histogram] = {}
+        self.counters: dict[str, Histogram] = {}
+        self.elapsed: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+
+    @staticmethod
+    def clock() -> float:
+        return time.perf_counter()
+
+    def add_time(self, phase: str, start: float):
+        self.elapsed[phase] = (self.elapsed.get(phase, 0.0) +
+                               time.perf_counter() - start)
+
+    def count(self, counter: str, amount: int = 1):
+        self.counts[counter] = self.counts.get(counter, 0) + amount
+
+    def end_command(self):
+        for phase, seconds in self.elapsed.items():
+            self.phases.setdefault(phase, Histogram()).add(seconds * 1e6)
+        for counter, amount in self.counts.items():
+            self.counters.setdefault(counter, Histogram()).add(amount)
+        self.elapsed.clear()
+        self.counts.clear()
+
+    def as_dict(self) -> dict:
+        return {
+            'phases_us': {
+                phase: histogram.as_dict()
+                for phase, histogram in self.phases.items()
+            },
+            'counters': {
+                counter: histogram.as_dict()
+                for counter, histogram in self.counters.items()
+            },
+        }
+
+    def write_json(self, file: TextIO):
+        json.dump(self.as_dict(), file, indent=2)
+
+    def write_report(self, file: TextIO):
+        """
+        Summary table of the histograms. Counters are per command, over the
+        commands where they were nonzero.
+        """
+        file.write(f'{"":<20} {"count":>8} {"mean":>10} {"p50":>10}'
+                   f' {"p99":>10} {"max":>10}\n')
+        for title, histograms in (('phase (us)', self.phases),
+                                  ('counter', self.counters)):
+            file.write(f'{title}\n')
+            for name, histogram in histograms.items():
+                stats = histogram.as_dict()
+                file.write(f'  {name:<18} {stats["count"]:>8}'
+                           f' {stats["mean"]:>10.1f} {stats["p50"]:>10.0f}'
+                           f' {stats["p99"]:>10.0f} {stats["max"]:>10.1f}\n')
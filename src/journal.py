@@ -0,0 +1,122 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+
+from core import Action, Entity, Location, Room, World, WorldListener
+
+
+class Delta(ABC):
+
+    @abstractmethod
+    def apply(self, world: World):
+        pass
+
+    @abstractmethod
+    def revert(self, world: World):
+        pass
+
+
+def place(world: World, entity: Entity, location: Location | None):
+    if location is None:
+        world.remove_from_container(entity)
+    else:
+        container, component = location
+        world.move_entity(entity, container, type(component))
+
+
+@dataclass
+class MoveDelta(Delta):
+    entity: Entity
+    source: Location | None
+    destination: Location | None
+
+    def apply(self, world: World):
+        place(world, self.entity, self.destination)
+
+    def revert(self, world: World):
+        place(world, self.entity, self.source)
+
+
+@dataclass
+class RoomDelta(Delta):
+    source: Room | None
+    destination: Room
+
+    def apply(self, world: World):
+        world.set_room(self.destination)
+
+    def revert(self, world: World):
+        if self.source is not None:
+            world.set_room(self.source)
+
+
+@dataclass
+class Entry:
+    action: Action
+    deltas: list[Delta]
+
+
+class Journal(WorldListener):
+    """
+    Undo/redo history of a world. Changes made while a command is applied
+    are recorded as deltas and grouped into one entry by commit; undoing or
+    redoing an entry costs time proportional to its number of deltas. At
+    most max_length entries are kept.
+    """
+
+    def __init__(self, world: World, max_length: int = 100):
+        self.world = world
+        self.history: deque[Entry] = deque(maxlen=max_length)
+        self.future: list[Entry] = []
+        self.pending: list[Delta] = []
+        self.replaying = False
+        world.listeners.append(self)
+
+    def entity_moved(self, entity: Entity, source: Location | None,
+                     destination: Location | None):
+        if not self.replaying:
+            self.pending.append(MoveDelta(entity, source, destination))
+
+    def room_changed(self, source: Room | None, destination: Room):
+        if not self.replaying:
+            self.pending.append(RoomDelta(source, destination))
+
+    def commit(self, action: Action):
+        if self.pending:
+            self.history.append(Entry(action, self.pending))
+            self.future.clear()
+            self.pending = []
+
+    def undo(self) -> bool:
+        if not self.history:
+            return False
+        entry = self.history.pop()
+        self.replaying = True
+        try:
+            for delta in reversed(entry.deltas):
+                delta.revert(self.world)
+        finally:
+            self.replaying = False
+        self.future.append(entry)
+        return True
+
+    def redo(self) -> bool:
+        if not self.future:
+            return False
+        entry = self.future.pop()
+        self.replaying = True
+        try:
+            for delta in entry.deltas:
+                delta.apply(self.world)
+        finally:
+            self.replaying = False
+        self.history.append(entry)
+        return True
+
+    def rewind(self, action: Action) -> bool:
+        """
+        Undo the latest entry if it was recorded for the given action.
+        """
+        if not self.history or self.history[-1].action is not action:
+            return False
+        return self.undo()
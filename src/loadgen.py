@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import statistics
+import time
+
+DEFAULT_SCRIPT = [
+    'look',
+    'examine key',
+    'take key',
+    'inventory',
+    'drop key',
+    'go east',
+    'go west',
+]
+
+
+async def run_session(open_connection, script: list[str],
+                      latencies: list[float]):
+    reader, writer = await open_connection()
+    try:
+        await reader.readuntil(b'> ')
+        for command_string in script:
+            start = time.perf_counter()
+            writer.write(command_string.encode() + b'\n')
+            await reader.readuntil(b'> ')
+            latencies.append(time.perf_counter() - start)
+        writer.write(b'exit\n')
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def generate_load(open_connection, sessions: int, concurrency: int,
+                        script: list[str]):
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            await run_session(open_connection, script, latencies)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited() for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'sessions:     {sessions} ({concurrency} concurrent)')
+    print(f'sessions/sec: {sessions / elapsed:.1f}')
+    print(f'commands/sec: {len(latencies) / elapsed:.1f}')
+    print(f'latency p50:  {statistics.median(latencies) * 1e3:.3f} ms')
+    print(f'latency p99:  {p99 * 1e3:.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run many concurrent scripted sessions against the game '
+        'server and report session throughput and command latency.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--unix', help='connect to a unix socket instead')
+    parser.add_argument('-n', '--sessions', type=int, default=1000)
+    parser.add_argument('-c', '--concurrency', type=int, default=100)
+    parser.add_argument('--script',
+                        help='file with one command per line to replay in '
+                        'every session')
+    args = parser.parse_args()
+
+    script = DEFAULT_SCRIPT
+    if args.script is not None:
+        with open(args.script, encoding='utf-8') as file:
+            script = [line.strip() for line in file if line.strip()]
+
+    def open_connection():
+        if args.unix is not None:
+            return asyncio.open_unix_connection(args.unix)
+        return asyncio.open_connection(args.host, args.port)
+
+    asyncio.run(
+        generate_load(open_connection, args.sessions, args.concurrency,
+                      script))
+
+
+if __name__ == '__main__':
+    main()
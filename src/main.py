@@ -1,19 +1,37 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import cProfile
 import logging
+import sys
+from functools import partial
+from pathlib import Path
+from typing import Callable
 
 import logzero
 
+import instrumentation
 from action import (DefaultEnterAction, DefaultExamineAction,
-                    DefaultTakeAction, DescribeWorldAction, DropAction,
-                    EnterAction, ExamineAction, InventoryAction, MoveAction,
-                    PutOnAction, TakeAction)
-from command import PatternCommand
-from component import (DescriptionComponent, Direction, FloorComponent,
-                       InventoryComponent, OnComponent, PortalComponent,
-                       TakeableComponent, WorldDescriptionComponent)
-from core import Action, Command, Entity, Room, World
-from util import CommandInterpretationError, interpret_command
+                    DefaultGoToAction, DefaultTakeAction, DescribeWorldAction,
+                    DropAction, EnterAction, ExamineAction, GoToAction,
+                    InventoryAction, MoveAction, PutOnAction, RedoAction,
+                    TakeAction, UndoAction, WaitAction)
+from command import (CountCommand, PatternCommand, load_pattern_cache,
+                     save_pattern_cache, translated_patterns)
+from component import Direction
+from core import Action, Command, World
+from instrumentation import Profiler
+from replay import read_transcript, replay_all, write_outputs, write_timings
+from roomcache import RoomCache
+from server import GameServer
+from session import Session
+from shard import ShardRouter, ShardServer
+from snapshot import load_snapshot, save_snapshot
+from util import CommandDispatcher
+from worldfile import WorldDefinition
+from worldgen import WorldShape, generate_world
+
+DEFAULT_WORLD = Path(__file__).parent / 'worlds' / 'plain.json'
 
 
 def make_command_to_action():
@@ -29,6 +47,10 @@ def make_command_to_action():
     move_south_command = PatternCommand('[move|go|travel|m ]s|south')
     move_west_command = PatternCommand('[move|go|travel|m ]w|west')
 
+    go_to_command = PatternCommand('go_to|travel_to|walk_to <item>')
+    travel_command = CountCommand(
+        'travel|walk <count> step|steps to|towards <item>')
+
     enter_command = PatternCommand(
         'enter|move_through|walk_through|go_through|travel_through <item>')
 
@@ -47,86 +69,191 @@ def make_command_to_action():
         (move_west_command, MoveAction(Direction.W)),
         (enter_command, EnterAction()),
         (enter_command, DefaultEnterAction()),
+        (PatternCommand('wait|z'), WaitAction()),
+        (PatternCommand('undo'), UndoAction()),
+        (PatternCommand('redo'), RedoAction()),
+        (go_to_command, GoToAction()),
+        (go_to_command, DefaultGoToAction()),
+        (travel_command, GoToAction()),
+        (travel_command, DefaultGoToAction()),
     ]
     return command_to_action
 
 
 def make_world():
-    world = World(player=Entity([
-        InventoryComponent(),
-        DescriptionComponent(names=['player', 'me', 'self', 'myself'],
-                             description="It's just you")
-    ]))
-
-    world.add_entity(
-        Entity([
-            DescriptionComponent(names=['you', 'narrator'],
-                                 description='Who, me?')
-        ]))
-
-    room1 = Room()
-    room2 = Room()
-
-    key = Entity([
-        DescriptionComponent(names=['iron key'],
-                             description='A rusty iron key'),
-        TakeableComponent(),
-    ])
-    room1.add_entity(key)
-    room1.add_entity(
-        Entity([
-            DescriptionComponent(names=['floor', 'ground']),
-            OnComponent({key}),
-            FloorComponent(),
-        ]))
-    room1.add_entity(
-        Entity([
-            WorldDescriptionComponent(
-                'You are on a floor in an infinite featureless plain.'
-                ' On the eastern edge of the plain looms an ethereal doorframe,'
-                ' beyond which you only see blackness.')
-        ]))
-    room1.add_entity(
-        Entity([
-            DescriptionComponent(names=['infinite featureless plain'],
-                                 description='It is featureless.')
-        ]))
-    room1.add_entity(
-        Entity([
-            DescriptionComponent(
-                names=['ethereal door', 'ethereal doorframe'],
-                description='Beyond the door there is only blackness.'),
-            PortalComponent(room=room2, direction=Direction.E),
-        ]))
-
-    room2.add_entity(
-        Entity([
-            WorldDescriptionComponent(
-                'It is very dark here. You cannot see or feel anything.')
-        ]))
-
-    world.add_room(room1)
-    world.add_room(room2)
-    world.set_room(room1)
-    return world
+    return WorldDefinition.load(DEFAULT_WORLD).make_world()
 
 
-def main():
+def make_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument('-v', '--verbose', action='store_true')
-    args = parser.parse_args()
+    parser.add_argument('--pattern-cache',
+                        type=Path,
+                        help='file caching translated command patterns')
+    parser.add_argument('--serve',
+                        action='store_true',
+                        help='serve concurrent sessions over TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4000)
+    parser.add_argument('--unix', help='serve on a unix socket instead of TCP')
+    parser.add_argument('--shards',
+                        type=int,
+                        default=0,
+                        help='number of worker processes to host sessions on '
+                        'when serving (default: serve in-process)')
+    parser.add_argument('--replay',
+                        nargs='+',
+                        metavar='TRANSCRIPT',
+                        help='run transcripts of commands (- for stdin) '
+                        'without prompting, each in a fresh world')
+    parser.add_argument('-o',
+                        '--output',
+                        help='file for replay output (default: stdout)')
+    parser.add_argument('--timings',
+                        help='file for per-command replay timings as JSON')
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help='number of processes to replay transcripts on')
+    parser.add_argument('--world',
+                        type=Path,
+                        default=DEFAULT_WORLD,
+                        help='JSON file describing the world to play in')
+    parser.add_argument('--max-rooms',
+                        type=int,
+                        help='number of unchanged rooms to keep in memory '
+                        '(not with --serve, where rooms are shared)')
+    parser.add_argument('--generate',
+                        action='store_true',
+                        help='play in a procedurally generated world')
+    parser.add_argument('--rooms', type=int, default=WorldShape.rooms)
+    parser.add_argument('--entities-per-room',
+                        type=int,
+                        default=WorldShape.entities_per_room)
+    parser.add_argument('--seed', type=int, default=WorldShape.seed)
+    parser.add_argument('--load',
+                        type=Path,
+                        help='play in a world loaded from a snapshot')
+    parser.add_argument('--save',
+                        type=Path,
+                        help='write a snapshot of the initial world and exit')
+    parser.add_argument('--profile',
+                        type=Path,
+                        help='write cProfile statistics to this file and '
+                        'command phase histograms to it plus .json '
+                        '(in-process only, so not with --jobs)')
+    parser.add_argument('--history',
+                        type=int,
+                        default=100,
+                        help='number of commands that can be undone')
+    return parser
+
+
+def make_cached_world(world_factory: Callable[[], World],
+                      max_rooms: int) -> World:
+    world = world_factory()
+    RoomCache(world, max_rooms)
+    return world
+
+
+def make_world_factory(args: argparse.Namespace) -> Callable[[], World]:
+    if args.load is not None:
+        world_factory = partial(load_snapshot, args.load)
+    elif args.generate:
+        world_factory = partial(
+            generate_world,
+            WorldShape(rooms=args.rooms,
+                       entities_per_room=args.entities_per_room,
+                       seed=args.seed))
+    else:
+        world_factory = WorldDefinition.load(args.world).make_world
+    if args.max_rooms is not None:
+        world_factory = partial(make_cached_world, world_factory,
+                                args.max_rooms)
+    return world_factory
+
+
+def replay(args: argparse.Namespace, world_factory: Callable[[], World]):
+    transcripts = [read_transcript(path) for path in args.replay]
+    results = replay_all(world_factory, make_command_to_action, transcripts,
+                         args.jobs)
+    if args.output is None:
+        write_outputs(results, sys.stdout)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            write_outputs(results, file)
+    if args.timings is not None:
+        with open(args.timings, 'w', encoding='utf-8') as file:
+            write_timings(results, file)
+
+
+def profile(path: Path, run: Callable[[], None]):
+    """
+    Run under cProfile, saving its statistics to path and the per-phase
+    histograms of command processing to path.json.
+    """
+    profiler = instrumentation.active = Profiler()
+    stats = cProfile.Profile()
+    try:
+        stats.runcall(run)
+    finally:
+        instrumentation.active = None
+        stats.dump_stats(path)
+        with open(path.with_name(path.name + '.json'), 'w',
+                  encoding='utf-8') as file:
+            profiler.write_json(file)
+        profiler.write_report(sys.stderr)
+
+
+def main():
+    args = make_parser().parse_args()
 
     if not args.verbose:
         logzero.loglevel(logging.FATAL)
 
-    command_to_action = make_command_to_action()
-    world = make_world()
+    cached_patterns = 0
+    if args.pattern_cache is not None:
+        load_pattern_cache(args.pattern_cache)
+        cached_patterns = len(translated_patterns)
+    dispatcher = CommandDispatcher(make_command_to_action())
+    if args.pattern_cache is not None and len(
+            translated_patterns) != cached_patterns:
+        save_pattern_cache(args.pattern_cache)
+
+    world_factory = make_world_factory(args)
+
+    if args.save is not None:
+        save_snapshot(world_factory(), args.save)
+        return
 
-    current_room = None
+    if args.profile is None:
+        play(args, world_factory, dispatcher)
+    else:
+        profile(args.profile, partial(play, args, world_factory, dispatcher))
+
+
+def play(args: argparse.Namespace, world_factory: Callable[[], World],
+         dispatcher: CommandDispatcher):
+    if args.replay is not None:
+        replay(args, world_factory)
+        return
+
+    if args.serve and args.shards > 0:
+        router = ShardRouter(world_factory, make_command_to_action,
+                             args.shards)
+        asyncio.run(ShardServer(router).serve(args.host, args.port, args.unix))
+        return
+
+    if args.serve:
+        # Sessions share one world and copy only what they change
+        server = GameServer(world_factory().instantiate, dispatcher)
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+        return
+
+    session = Session(world_factory(), dispatcher, args.history)
+    session.start()
     while True:
-        if world.current_room != current_room:
-            DescribeWorldAction().apply(world, [])
-            current_room = world.current_room
         try:
             command_string = input('> ')
         except EOFError:
@@ -134,12 +261,7 @@ def main():
         if command_string == 'exit':
             break
 
-        try:
-            action, entities = interpret_command(world, command_to_action,
-                                                 command_string)
-            action.apply(world, entities)
-        except CommandInterpretationError as err:
-            print(err.message)
+        session.run(command_string)
 
 
 if __name__ == '__main__':
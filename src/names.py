@@ -0,0 +1,85 @@
+import re
+
+import instrumentation
+from component import DescriptionComponent
+from core import Entity, EntityComponent, EntityIndex, IndexListener
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def name_spans(name: str) -> set[str]:
+    """
+    All substrings of name running from the start of one word to the end of
+    the same or a later word. A text starting and ending in a word character
+    matches name at word boundaries exactly when it is one of these.
+    """
+    words = [(match.start(), match.end())
+             for match in WORD_PATTERN.finditer(name)]
+    return {
+        name[start:end]
+        for i, (start, _) in enumerate(words)
+        for _, end in words[i:]
+    }
+
+
+def is_tokenized(text: str) -> bool:
+    return WORD_PATTERN.fullmatch(text[:1] + text[-1:]) is not None
+
+
+class NameIndex(IndexListener):
+    """
+    Inverted index from name spans to the described entities of an
+    EntityIndex, giving the same results as DescriptionComponent.matches.
+    """
+
+    def __init__(self, index: EntityIndex):
+        self.index = index
+        self.entities_by_span: dict[str, dict[Entity, None]] = {}
+        for entity in index.with_component(DescriptionComponent):
+            self.add(entity, entity[DescriptionComponent])
+
+    def add(self, entity: Entity, component: DescriptionComponent):
+        for name in component.names:
+            for span in name_spans(name):
+                self.entities_by_span.setdefault(span, {})[entity] = None
+
+    def discard(self, entity: Entity, component: DescriptionComponent):
+        for name in component.names:
+            for span in name_spans(name):
+                entities = self.entities_by_span.get(span)
+                if entities is not None:
+                    entities.pop(entity, None)
+                    if not entities:
+                        del self.entities_by_span[span]
+
+    def entity_added(self, entity: Entity):
+        component = entity.get(DescriptionComponent)
+        if component is not None:
+            self.add(entity, component)
+
+    def entity_removed(self, entity: Entity):
+        component = entity.get(DescriptionComponent)
+        if component is not None:
+            self.discard(entity, component)
+
+    def component_added(self, entity: Entity, component: EntityComponent):
+        if isinstance(component, DescriptionComponent):
+            self.add(entity, component)
+
+    def component_removed(self, entity: Entity, component: EntityComponent):
+        if isinstance(component, DescriptionComponent):
+            self.discard(entity, component)
+
+    def lookup(self, text: str) -> list[Entity]:
+        if not is_tokenized(text):
+            described = self.index.with_component(DescriptionComponent)
+            if instrumentation.active is not None:
+                instrumentation.active.count('entity_scans', len(described))
+            return [
+                entity for entity in described
+                if entity[DescriptionComponent].matches(text)
+            ]
+        entities = list(self.entities_by_span.get(text, ()))
+        if instrumentation.active is not None:
+            instrumentation.active.count('entity_scans', len(entities))
+        return entities
@@ -0,0 +1,70 @@
+import sys
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class OutputSink(ABC):
+    """
+    Destination for the text produced by actions. Text is written one
+    message at a time and delivered on flush, which the command loop calls
+    once per command.
+    """
+
+    @abstractmethod
+    def write(self, text: str):
+        pass
+
+    def flush(self):
+        pass
+
+
+class StreamSink(OutputSink):
+    """
+    Buffers messages and writes them to a stream in one call per flush. With
+    an encoding, the stream is given bytes, e.g. for an asyncio transport.
+    """
+
+    def __init__(self, stream: Any = None, encoding: str | None = None):
+        self.stream = stream if stream is not None else sys.stdout
+        self.encoding = encoding
+        self.buffer: list[str] = []
+
+    def write(self, text: str):
+        self.buffer.append(text)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        text = '\n'.join(self.buffer) + '\n'
+        self.buffer.clear()
+        if self.encoding is None:
+            self.stream.write(text)
+            self.stream.flush()
+        else:
+            self.stream.write(text.encode(self.encoding))
+
+
+class CollectingSink(OutputSink):
+    """
+    Keeps all messages in memory until they are taken.
+    """
+
+    def __init__(self):
+        self.messages: list[str] = []
+
+    def write(self, text: str):
+        self.messages.append(text)
+
+    def take(self) -> str:
+        text = ''.join(message + '\n' for message in self.messages)
+        self.messages.clear()
+        return text
+
+
+class NullSink(OutputSink):
+    """
+    Discards all output.
+    """
+
+    def write(self, text: str):
+        pass
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import instrumentation
+from core import (ContainerComponent, Entity, EntityIndex, Location, Room,
+                  World, WorldListener)
+
+# Renders text, returning it with the containers whose contents it lists
+Renderer = Callable[[], tuple[str, list[ContainerComponent]]]
+# Current room and the key given to RenderCache.render
+EntryKey = tuple[Room | None, Hashable]
+# Entity indices that rendered text depends on, with their versions then
+Versions = list[tuple[EntityIndex, int]]
+
+
+class RenderCache(WorldListener):
+    """
+    Least recently used cache of text rendered for a world, keyed by the
+    current room and a caller-chosen key. An entry is dropped when an entity
+    moves into or out of one of the containers it lists, and is stale once
+    the version of an entity index it depends on changes: the global and
+    current room indices, and those holding the entities it lists, which
+    may be in other rooms. Use render_cache to get the cache of a world.
+    """
+
+    max_size = 1024
+
+    def __init__(self, world: World):
+        self.world = world
+        self.entries: OrderedDict[EntryKey, tuple[
+            Versions, str, list[ContainerComponent]]] = OrderedDict()
+        self.dependents: dict[ContainerComponent, set[EntryKey]] = {}
+        world.listeners.append(self)
+
+    def entity_moved(self, entity: Entity, source: Location | None,
+                     destination: Location | None):
+        for location in (source, destination):
+            if location is not None:
+                for key in self.dependents.pop(location[1], ()):
+                    self.discard(key)
+
+    def discard(self, key: EntryKey):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for container in entry[2]:
+            keys = self.dependents.get(container)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependents[container]
+
+    def render(self, key: Hashable, renderer: Renderer) -> str:
+        world = self.world
+        entry_key = world.current_room, key
+        entry = self.entries.get(entry_key)
+        if entry is not None and all(index.version == version
+                                     for index, version in entry[0]):
+            self.entries.move_to_end(entry_key)
+            if instrumentation.active is not None:
+                instrumentation.active.count('render_cache_hits')
+            return entry[1]
+
+        self.discard(entry_key)
+        text, containers = renderer()
+        self.entries[entry_key] = (self.versions(containers), text, containers)
+        for container in containers:
+            self.dependents.setdefault(container, set()).add(entry_key)
+        if len(self.entries) > self.max_size:
+            self.discard(next(iter(self.entries)))
+        return text
+
+    def versions(self, containers: list[ContainerComponent]) -> Versions:
+        indices = dict.fromkeys(self.world.iter_indices())
+        for container in containers:
+            for item in self.world.items(container):
+                indices.update(dict.fromkeys(item.observers))
+        return [(index, index.version) for index in indices]
+
+
+def render_cache(world: World) -> RenderCache:
+    """
+    Get the render cache of a world, attaching one on first use. Unlike
+    World.shared caches, it is not shared by instances of the world, since
+    they move entities independently.
+    """
+    cache = world.find_listener(RenderCache)
+    if cache is None:
+        cache = RenderCache(world)
+    return cache
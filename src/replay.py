@@ -0,0 +1,110 @@
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, TextIO
+
+from core import Action, Command, World
+from output import CollectingSink
+from session import Session
+from util import CommandDispatcher
+
+WorldFactory = Callable[[], World]
+CommandTableFactory = Callable[[], list[tuple[Command, Action]]]
+
+
+@dataclass
+class Transcript:
+    name: str
+    commands: list[str]
+
+
+@dataclass
+class TranscriptResult:
+    name: str
+    output: str
+    timings: list[float]
+
+
+def read_transcript(path: str) -> Transcript:
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+    return Transcript(path, lines)
+
+
+def replay(world: World, dispatcher: CommandDispatcher,
+           transcript: Transcript) -> TranscriptResult:
+    sink = CollectingSink()
+    world.output = sink
+    session = Session(world, dispatcher)
+    session.start()
+
+    output = [sink.take()]
+    timings = []
+    for command_string in transcript.commands:
+        if command_string == 'exit':
+            break
+        start = time.perf_counter()
+        session.run(command_string)
+        timings.append(time.perf_counter() - start)
+        output.append(f'> {command_string}\n')
+        output.append(sink.take())
+
+    return TranscriptResult(transcript.name, ''.join(output), timings)
+
+
+def replay_fresh(world_factory: WorldFactory,
+                 command_table_factory: CommandTableFactory,
+                 transcript: Transcript) -> TranscriptResult:
+    return replay(world_factory(), CommandDispatcher(command_table_factory()),
+                  transcript)
+
+
+def replay_all(world_factory: WorldFactory,
+               command_table_factory: CommandTableFactory,
+               transcripts: list[Transcript],
+               jobs: int = 1) -> list[TranscriptResult]:
+    """
+    Replay every transcript against its own fresh world, fanning them out
+    over a pool of jobs processes if jobs > 1.
+    """
+    if jobs <= 1:
+        dispatcher = CommandDispatcher(command_table_factory())
+        return [
+            replay(world_factory(), dispatcher, transcript)
+            for transcript in transcripts
+        ]
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(
+            executor.map(
+                partial(replay_fresh, world_factory, command_table_factory),
+                transcripts))
+
+
+def write_outputs(results: list[TranscriptResult], file: TextIO):
+    for result in results:
+        if len(results) > 1:
+            file.write(f'==> {result.name} <==\n')
+        file.write(result.output)
+
+
+def write_timings(results: list[TranscriptResult], file: TextIO):
+    json.dump(
+        {
+            'transcripts': [{
+                'name': result.name,
+                'commands': len(result.timings),
+                'total': sum(result.timings),
+                'max': max(result.timings, default=0.0),
+                'timings': result.timings,
+            } for result in results]
+        },
+        file,
+        indent=2)
+    file.write('\n')
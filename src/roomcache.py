@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+from core import Entity, EntityIndex, Location, Room, World, WorldListener
+from scheduler import Scheduler
+
+
+class RoomCache(WorldListener):
+    """
+    Keeps at most max_rooms lazily loaded rooms besides the current one in
+    memory, evicting the least recently visited ones first. Rooms in which
+    anything has moved are never evicted, since reloading them would undo
+    the change, and neither are rooms holding entities that pending timers
+    act on.
+    """
+
+    def __init__(self, world: World, max_rooms: int):
+        self.world = world
+        self.max_rooms = max_rooms
+        self.visited: OrderedDict[Room, None] = OrderedDict()
+        # Entity indices of the moved entities and of their containers
+        self.dirty: set[EntityIndex] = set()
+        world.listeners.append(self)
+
+    def entity_moved(self, entity: Entity, source: Location | None,
+                     destination: Location | None):
+        # Timed actions move entities in other rooms than the current one
+        self.dirty.update(entity.observers)
+        for location in (source, destination):
+            if location is not None:
+                self.dirty.update(location[0].observers)
+
+    def evictable(self, room: Room) -> bool:
+        if room.loader is None or room.entities in self.dirty:
+            return False
+        scheduler = self.world.find_listener(Scheduler)
+        return scheduler is None or room.entities not in scheduler.pinned
+
+    def room_changed(self, source: Room | None, destination: Room):
+        self.visited.pop(destination, None)
+        if (source is None or source is destination
+                or not self.evictable(source)):
+            return
+        self.visited[source] = None
+        while len(self.visited) > self.max_rooms:
+            room, _ = self.visited.popitem(last=False)
+            # Rooms changed since they were visited are kept too
+            if self.evictable(room):
+                room.evict()
@@ -0,0 +1,145 @@
+import heapq
+import itertools
+from typing import Sequence
+
+import instrumentation
+from core import Action, Entity, EntityIndex, World, WorldListener
+from output import NullSink
+from util import matches_prerequisites
+
+
+class Timer:
+    """
+    An action scheduled to be applied to some entities at a given tick, and
+    then every period ticks if it is periodic.
+    """
+
+    __slots__ = ('due', 'action', 'entities', 'period', 'pending')
+
+    def __init__(self, due: int, action: Action, entities: list[Entity],
+                 period: int | None):
+        self.due = due
+        self.action = action
+        self.entities = entities
+        self.period = period
+        self.pending = True
+
+
+class Scheduler(WorldListener):
+    """
+    Game clock of a world, counted in ticks, and the timers due at later
+    ticks, kept in a heap. Cancelling a timer only marks it; it is dropped
+    when it reaches the top of the heap, or when cancelled timers make up
+    half of the heap and it is rebuilt. Advancing the clock costs time
+    proportional to the number of timers falling due, not to the number
+    pending. Timers may act on entities in any loaded room; the indices
+    holding them are counted in pinned, so that RoomCache keeps their rooms
+    loaded. Use scheduler_of to get the scheduler of a world.
+    """
+
+    def __init__(self, world: World):
+        self.world = world
+        self.time = 0
+        self.heap: list[tuple[int, int, Timer]] = []
+        self.sequence = itertools.count()
+        self.cancelled = 0
+        self.pinned: dict[EntityIndex, int] = {}
+        world.listeners.append(self)
+
+    def __len__(self):
+        return len(self.heap) - self.cancelled
+
+    def schedule(self,
+                 delay: int,
+                 action: Action,
+                 entities: Sequence[Entity] = (),
+                 period: int | None = None) -> Timer:
+        """
+        Apply action to entities delay ticks from now, and every period
+        ticks after that if period is given. Timers due at the same tick
+        run in the order they were scheduled.
+        """
+        if delay < 0:
+            raise ValueError('Cannot schedule a timer in the past')
+        if period is not None and period < 1:
+            raise ValueError('Timer period must be positive')
+        if len(entities) != len(action.prerequisites()):
+            raise ValueError(f'Action expects {len(action.prerequisites())}'
+                             f' entities, got {len(entities)}')
+        timer = Timer(self.time + delay, action, list(entities), period)
+        self.push(timer)
+        self.pin(timer, 1)
+        return timer
+
+    def push(self, timer: Timer):
+        heapq.heappush(self.heap, (timer.due, next(self.sequence), timer))
+
+    def pin(self, timer: Timer, count: int):
+        for entity in timer.entities:
+            for index in entity.observers:
+                pins = self.pinned.get(index, 0) + count
+                if pins > 0:
+                    self.pinned[index] = pins
+                else:
+                    self.pinned.pop(index, None)
+
+    def cancel(self, timer: Timer):
+        if not timer.pending:
+            return
+        timer.pending = False
+        self.pin(timer, -1)
+        self.cancelled += 1
+        if self.cancelled > len(self.heap) // 2:
+            self.heap = [entry for entry in self.heap if entry[2].pending]
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+
+    def advance(self, ticks: int = 1):
+        """
+        Move the clock forward, applying the actions of the timers that fall
+        due in order. A timer whose entities no longer match its action's
+        prerequisites is skipped. The output of actions on entities out of
+        scope is discarded, since the player cannot see them.
+        """
+        end = self.time + ticks
+        fired = 0
+        while self.heap and self.heap[0][0] <= end:
+            due, _, timer = heapq.heappop(self.heap)
+            if not timer.pending:
+                self.cancelled -= 1
+                continue
+            self.time = due
+            if timer.period is None:
+                timer.pending = False
+                self.pin(timer, -1)
+            else:
+                timer.due = due + timer.period
+                self.push(timer)
+            if matches_prerequisites(timer.action, timer.entities, False):
+                self.apply(timer)
+                fired += 1
+        self.time = end
+        if fired and instrumentation.active is not None:
+            instrumentation.active.count('timers_fired', fired)
+
+    def apply(self, timer: Timer):
+        world = self.world
+        if all(entity in world.current_entities for entity in timer.entities):
+            timer.action.apply(world, timer.entities)
+            return
+        output, world.output = world.output, NullSink()
+        try:
+            timer.action.apply(world, timer.entities)
+        finally:
+            world.output = output
+
+
+def scheduler_of(world: World) -> Scheduler:
+    """
+    Get the scheduler of a world, attaching one on first use. Instances of
+    a world each keep their own clock and timers.
+    """
+    scheduler = world.find_listener(Scheduler)
+    if scheduler is None:
+        scheduler = Scheduler(world)
+    return scheduler
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from logzero import logger
+
+from core import World
+from output import StreamSink
+from session import Session
+from util import CommandDispatcher
+
+PROMPT = '> '
+
+ConnectionHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter],
+                             Awaitable[None]]
+
+
+class GameServer:
+    """
+    Serves one independent game session per connection over a line-based
+    protocol (usable with telnet or netcat). Every session gets a fresh
+    world from world_factory, e.g. World.instantiate of a shared world; the
+    dispatcher is shared.
+    """
+
+    def __init__(self, world_factory: Callable[[], World],
+                 dispatcher: CommandDispatcher):
+        self.world_factory = world_factory
+        self.dispatcher = dispatcher
+        self.sessions = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        world = self.world_factory()
+        world.output = StreamSink(writer, encoding='utf-8')
+        session = Session(world, self.dispatcher)
+        self.sessions += 1
+        try:
+            session.start()
+            writer.write(PROMPT.encode())
+            while line := await reader.readline():
+                command_string = line.decode(errors='replace').strip()
+                if command_string == 'exit':
+                    break
+                session.run(command_string)
+                writer.write(PROMPT.encode())
+                await writer.drain()
+        except ConnectionError as err:
+            logger.info('Session closed: %s', err)
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def serve(self,
+                    host: str | None = None,
+                    port: int | None = None,
+                    path: str | None = None):
+        await serve_connections(self.handle_connection, host, port, path)
+
+
+async def serve_connections(handler: ConnectionHandler,
+                            host: str | None = None,
+                            port: int | None = None,
+                            path: str | None = None):
+    """
+    Accept connections on a unix socket if path is given, or else over TCP,
+    handling each with handler until cancelled.
+    """
+    if path is not None:
+        server = await asyncio.start_unix_server(handler, path, backlog=4096)
+    else:
+        server = await asyncio.start_server(handler, host, port, backlog=4096)
+    logger.info('Serving on %s',
+                ', '.join(str(s.getsockname()) for s in server.sockets))
+    async with server:
+        await server.serve_forever()
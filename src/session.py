@@ -0,0 +1,73 @@
+import instrumentation
+from action import DescribeWorldAction
+from core import Action, Entity, World
+from journal import Journal
+from scheduler import Scheduler
+from util import (CommandDispatcher, CommandInterpretationError,
+                  interpret_command)
+
+
+class Session:
+    """
+    One player's game: their world plus the state of the command loop
+    around it.
+    """
+
+    def __init__(self,
+                 world: World,
+                 dispatcher: CommandDispatcher,
+                 history: int = 100):
+        self.world = world
+        self.dispatcher = dispatcher
+        self.current_room = None
+        self.journal = Journal(world, history) if history > 0 else None
+
+    def describe_room_if_changed(self):
+        if self.world.current_room != self.current_room:
+            DescribeWorldAction().apply(self.world, [])
+            self.current_room = self.world.current_room
+
+    def start(self):
+        self.describe_room_if_changed()
+        self.world.output.flush()
+
+    def run(self, command_string: str):
+        try:
+            action, entities = interpret_command(self.world, self.dispatcher,
+                                                 command_string)
+        except CommandInterpretationError as err:
+            self.reject(err)
+        else:
+            self.perform(action, entities)
+
+    def perform(self, action: Action, entities: list[Entity]):
+        """
+        Finish a turn by applying an interpreted command.
+        """
+        profiler = instrumentation.active
+        if profiler is not None:
+            start = profiler.clock()
+        action.apply(self.world, entities)
+        # Timed events are part of the turn: undoing it reverts their
+        # changes, though not the clock
+        scheduler = self.world.find_listener(Scheduler)
+        if scheduler is not None and action.duration > 0:
+            scheduler.advance(action.duration)
+        if self.journal is not None:
+            self.journal.commit(action)
+        if profiler is not None:
+            profiler.add_time('apply', start)
+        self.end_turn()
+
+    def reject(self, err: CommandInterpretationError):
+        """
+        Finish a turn whose command could not be interpreted.
+        """
+        self.world.output.write(err.message)
+        self.end_turn()
+
+    def end_turn(self):
+        self.describe_room_if_changed()
+        self.world.output.flush()
+        if instrumentation.active is not None:
+            instrumentation.active.end_command()
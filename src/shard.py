@@ -0,0 +1,466 @@
+import asyncio
+import itertools
+import multiprocessing
+import signal
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any
+
+import logzero
+from logzero import logger
+
+from core import Action, ContainerOverlay, Entity, EntityIndex, World
+from output import CollectingSink
+from replay import CommandTableFactory, WorldFactory
+from scheduler import Scheduler, scheduler_of
+from server import PROMPT, serve_connections
+from session import Session
+from util import CommandDispatcher
+
+# An entity, as the position in World.rooms of the room holding it (-1 for
+# global entities) and its position in that room's entities
+EntityRef = tuple[int, int]
+
+
+class EntityRefs:
+    """
+    Refers to the entities of a world by position, so that a reference made
+    in one process resolves to the same entity in another process that built
+    the world the same way. Rooms are materialized when resolving.
+    """
+
+    def __init__(self, world: World):
+        self.world = world
+        self.rooms = list(world.rooms)
+        self.sections: dict[EntityIndex, int] = {world.global_entities: -1}
+        for i, room in enumerate(self.rooms):
+            if room.loaded:
+                self.sections[room.entities] = i
+        self.positions: dict[EntityIndex, dict[Entity, int]] = {}
+        self.entities: dict[int, list[Entity]] = {}
+
+    def ref(self, entity: Entity) -> EntityRef:
+        for index in entity.observers:
+            section = self.sections.get(index)
+            if section is None:
+                continue
+            positions = self.positions.get(index)
+            if positions is None:
+                positions = self.positions[index] = {
+                    entity: i
+                    for i, entity in enumerate(index)
+                }
+            return section, positions[entity]
+        raise ValueError('Entity is not in any room or the world')
+
+    def resolve(self, ref: EntityRef) -> Entity:
+        section, position = ref
+        entities = self.entities.get(section)
+        if entities is None:
+            if section < 0:
+                index = self.world.global_entities
+            else:
+                room = self.rooms[section]
+                room.materialize()
+                index = room.entities
+            entities = self.entities[section] = list(index)
+        return entities[position]
+
+
+@dataclass
+class SessionState:
+    """
+    What a game played in an instance of a world has changed: its current
+    room, the contents of the containers it changed and where the entities
+    moved in them are, plus its clock and pending timers. Components are
+    given by type id. Undo history is not kept.
+    """
+    room: int
+    contents: list[tuple[EntityRef, int, list[EntityRef]]]
+    locations: list[tuple[EntityRef, tuple[EntityRef, int] | None]]
+    time: int
+    timers: list[tuple[int, Action, list[EntityRef], int | None]]
+
+
+def export_state(world: World) -> SessionState:
+    refs = EntityRefs(world)
+    overlay = world.overlay
+    contents = [(refs.ref(overlay.owners[component]), component.type_id,
+                 [refs.ref(item) for item in items])
+                for component, items in overlay.contents.items()]
+    locations = []
+    for entity, location in overlay.locations.items():
+        if location is None:
+            locations.append((refs.ref(entity), None))
+        else:
+            container, component = location
+            locations.append(
+                (refs.ref(entity), (refs.ref(container), component.type_id)))
+
+    room = -1
+    if world.current_room is not None:
+        room = refs.rooms.index(world.current_room)
+
+    time, timers = 0, []
+    scheduler = world.find_listener(Scheduler)
+    if scheduler is not None:
+        time = scheduler.time
+        timers = [(timer.due, timer.action,
+                   [refs.ref(entity)
+                    for entity in timer.entities], timer.period)
+                  for _, _, timer in sorted(scheduler.heap) if timer.pending]
+    return SessionState(room, contents, locations, time, timers)
+
+
+def import_containers(refs: EntityRefs, overlay: ContainerOverlay,
+                      state: SessionState):
+    for owner_ref, type_id, item_refs in state.contents:
+        owner = refs.resolve(owner_ref)
+        component = owner.components[type_id]
+        overlay.contents[component] = dict.fromkeys(
+            map(refs.resolve, item_refs))
+        overlay.owners[component] = owner
+    for entity_ref, location_ref in state.locations:
+        entity = refs.resolve(entity_ref)
+        if location_ref is None:
+            overlay.locations[entity] = None
+        else:
+            container = refs.resolve(location_ref[0])
+            overlay.locations[entity] = (container,
+                                         container.components[location_ref[1]])
+
+
+def import_state(world: World, state: SessionState):
+    """
+    Replay a state exported from another instance of the same world onto a
+    fresh instance.
+    """
+    refs = EntityRefs(world)
+    import_containers(refs, world.overlay, state)
+    if state.room >= 0:
+        world.set_room(refs.rooms[state.room])
+    if state.time > 0 or state.timers:
+        scheduler = scheduler_of(world)
+        scheduler.time = state.time
+        for due, action, entity_refs, period in state.timers:
+            scheduler.schedule(due - state.time, action,
+                               [refs.resolve(ref) for ref in entity_refs],
+                               period)
+
+
+class ShardWorker:
+    """
+    Sessions hosted by one worker process, each playing an instance of the
+    worker's world.
+    """
+
+    def __init__(self, world: World, dispatcher: CommandDispatcher):
+        self.world = world
+        self.dispatcher = dispatcher
+        self.sessions: dict[int, tuple[Session, CollectingSink]] = {}
+
+    def add(self, session_id: int, state: SessionState | None) -> Session:
+        sink = CollectingSink()
+        world = self.world.instantiate(sink)
+        if state is not None:
+            import_state(world, state)
+        session = Session(world, self.dispatcher)
+        self.sessions[session_id] = session, sink
+        return session
+
+    def open(self, session_id: int) -> str:
+        self.add(session_id, None).start()
+        return self.sessions[session_id][1].take()
+
+    def run(self, session_id: int, command_string: str) -> str:
+        session, sink = self.sessions[session_id]
+        session.run(command_string)
+        return sink.take()
+
+    def close(self, session_id: int):
+        del self.sessions[session_id]
+
+    def export(self, session_id: int) -> SessionState:
+        session, _ = self.sessions[session_id]
+        state = export_state(session.world)
+        del self.sessions[session_id]
+        return state
+
+    def adopt(self, session_id: int, state: SessionState):
+        session = self.add(session_id, state)
+        # The player has already seen the room
+        session.current_room = session.world.current_room
+
+
+def run_worker(connection: Connection, world_factory: WorldFactory,
+               command_table_factory: CommandTableFactory, log_level: int):
+    """
+    Serve requests from a router until it asks to stop or exits. A request
+    is a (request id, method, arguments) tuple, answered with (request id,
+    result, error message or None).
+    """
+    # The router stops the workers, so leave interrupts to it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logzero.loglevel(log_level)
+    worker = ShardWorker(world_factory(),
+                         CommandDispatcher(command_table_factory()))
+    methods = {
+        'open': worker.open,
+        'run': worker.run,
+        'close': worker.close,
+        'export': worker.export,
+        'adopt': worker.adopt,
+    }
+    while True:
+        try:
+            request_id, method, args = connection.recv()
+        except EOFError:
+            # The router has exited
+            return
+        if method == 'stop':
+            connection.send((request_id, None, None))
+            return
+        try:
+            result = methods[method](*args)
+        # pylint: disable-next=broad-except
+        except Exception as err:
+            connection.send((request_id, None, repr(err)))
+        else:
+            connection.send((request_id, result, None))
+
+
+class WorkerError(Exception):
+
+    def __init__(self, message: str):
+        super().__init__(f'Worker failed: {message}')
+        self.message = message
+
+
+class WorkerHandle:
+
+    def __init__(self, process: BaseProcess, connection: Connection):
+        self.process = process
+        self.connection = connection
+        self.pending: dict[int, asyncio.Future] = {}
+        self.sessions: set[int] = set()
+        self.accepting = True
+
+
+class ShardRouter:
+    """
+    Pins each session to one of a pool of worker processes, each building
+    its own world with world_factory, and forwards the session's commands to
+    it over a pipe. New sessions go to the accepting worker with the fewest
+    sessions. A session migrates between workers by exporting its state
+    from one and adopting it in the other, which requires world_factory to
+    build the same world every time.
+    """
+
+    def __init__(self, world_factory: WorldFactory,
+                 command_table_factory: CommandTableFactory, workers: int):
+        self.world_factory = world_factory
+        self.command_table_factory = command_table_factory
+        self.size = workers
+        self.workers: list[WorkerHandle] = []
+        self.pins: dict[int, WorkerHandle] = {}
+        self.locks: dict[int, asyncio.Lock] = {}
+        self.request_ids = itertools.count()
+
+    def start(self):
+        """
+        Start the workers. Must be called from the event loop.
+        """
+        for _ in range(self.size):
+            self.workers.append(self.spawn())
+
+    def spawn(self) -> WorkerHandle:
+        # Forking the event loop's process is unsafe, so start afresh
+        context = multiprocessing.get_context('spawn')
+        connection, worker_connection = context.Pipe()
+        process = context.Process(target=run_worker,
+                                  args=(worker_connection, self.world_factory,
+                                        self.command_table_factory,
+                                        logger.level),
+                                  daemon=True)
+        process.start()
+        worker_connection.close()
+        worker = WorkerHandle(process, connection)
+        asyncio.get_running_loop().add_reader(connection.fileno(),
+                                              self.receive, worker)
+        return worker
+
+    def receive(self, worker: WorkerHandle):
+        try:
+            while worker.connection.poll():
+                request_id, result, error = worker.connection.recv()
+                future = worker.pending.pop(request_id)
+                if future.cancelled():
+                    continue
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(WorkerError(error))
+        except (EOFError, OSError):
+            logger.warning('Worker %d exited', worker.process.pid)
+            asyncio.get_running_loop().remove_reader(
+                worker.connection.fileno())
+            worker.accepting = False
+            for future in worker.pending.values():
+                if not future.cancelled():
+                    future.set_exception(WorkerError('worker exited'))
+            worker.pending.clear()
+
+    async def call(self, worker: WorkerHandle, method: str, *args) -> Any:
+        request_id = next(self.request_ids)
+        future = asyncio.get_running_loop().create_future()
+        worker.pending[request_id] = future
+        try:
+            worker.connection.send((request_id, method, args))
+        except OSError as err:
+            del worker.pending[request_id]
+            raise WorkerError(str(err)) from err
+        return await future
+
+    def least_loaded(self) -> WorkerHandle:
+        accepting = [worker for worker in self.workers if worker.accepting]
+        if not accepting:
+            raise WorkerError('no worker is accepting sessions')
+        return min(accepting, key=lambda worker: len(worker.sessions))
+
+    def pin(self, session_id: int, worker: WorkerHandle):
+        self.pins[session_id] = worker
+        worker.sessions.add(session_id)
+
+    async def open(self, session_id: int) -> str:
+        worker = self.least_loaded()
+        self.pin(session_id, worker)
+        self.locks[session_id] = asyncio.Lock()
+        return await self.call(worker, 'open', session_id)
+
+    async def run(self, session_id: int, command_string: str) -> str:
+        async with self.locks[session_id]:
+            return await self.call(self.pins[session_id], 'run', session_id,
+                                   command_string)
+
+    async def close(self, session_id: int):
+        lock = self.locks.get(session_id)
+        if lock is None:
+            return
+        async with lock:
+            del self.locks[session_id]
+            worker = self.pins.pop(session_id)
+            worker.sessions.discard(session_id)
+            await self.call(worker, 'close', session_id)
+            if worker not in self.workers and not worker.sessions:
+                await self.stop(worker)
+
+    async def migrate(self, session_id: int, destination: WorkerHandle):
+        lock = self.locks.get(session_id)
+        if lock is None:
+            return
+        async with lock:
+            source = self.pins.get(session_id)
+            if source is None or source is destination:
+                return
+            state = await self.call(source, 'export', session_id)
+            try:
+                await self.call(destination, 'adopt', session_id, state)
+            except WorkerError:
+                # The source no longer has the session, so give it back
+                await self.call(source, 'adopt', session_id, state)
+                raise
+            source.sessions.discard(session_id)
+            self.pin(session_id, destination)
+
+    async def drain(self, worker: WorkerHandle):
+        """
+        Stop sending new sessions to a worker and migrate its sessions to the
+        others.
+        """
+        worker.accepting = False
+        for session_id in list(worker.sessions):
+            try:
+                await self.migrate(session_id, self.least_loaded())
+            except WorkerError as err:
+                logger.warning('Could not migrate session %d: %s', session_id,
+                               err)
+
+    async def restart(self, index: int):
+        """
+        Replace a worker by a new process, migrating its sessions.
+        """
+        old = self.workers[index]
+        self.workers[index] = self.spawn()
+        await self.drain(old)
+        if old.sessions:
+            # Leave the old worker to the sessions that could not migrate,
+            # until they close
+            logger.warning('Worker %d keeps %d sessions', index,
+                           len(old.sessions))
+        else:
+            await self.stop(old)
+        logger.info('Restarted worker %d', index)
+
+    async def stop(self, worker: WorkerHandle):
+        await self.call(worker, 'stop')
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(worker.connection.fileno())
+        worker.connection.close()
+        await loop.run_in_executor(None, worker.process.join)
+
+    async def restart_all(self):
+        for index in range(len(self.workers)):
+            try:
+                await self.restart(index)
+            except WorkerError as err:
+                logger.warning('Could not restart worker %d: %s', index, err)
+
+
+class ShardServer:
+    """
+    Line-based game server like GameServer, with the sessions hosted by the
+    worker processes of a ShardRouter. SIGHUP restarts the workers one at a
+    time, migrating their sessions without disconnecting them.
+    """
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+        self.session_ids = itertools.count()
+        self.restarts: set[asyncio.Task] = set()
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        session_id = next(self.session_ids)
+        try:
+            output = await self.router.open(session_id)
+            writer.write((output + PROMPT).encode())
+            while line := await reader.readline():
+                command_string = line.decode(errors='replace').strip()
+                if command_string == 'exit':
+                    break
+                output = await self.router.run(session_id, command_string)
+                writer.write((output + PROMPT).encode())
+                await writer.drain()
+        except (ConnectionError, WorkerError) as err:
+            logger.info('Session closed: %s', err)
+        finally:
+            writer.close()
+            try:
+                await self.router.close(session_id)
+            except WorkerError as err:
+                logger.info('Could not close session: %s', err)
+
+    def restart_workers(self):
+        task = asyncio.create_task(self.router.restart_all())
+        self.restarts.add(task)
+        task.add_done_callback(self.restarts.discard)
+
+    async def serve(self,
+                    host: str | None = None,
+                    port: int | None = None,
+                    path: str | None = None):
+        self.router.start()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP,
+                                                      self.restart_workers)
+        await serve_connections(self.handle_connection, host, port, path)
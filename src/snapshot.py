@@ -0,0 +1,434 @@
+import bisect
+import mmap
+import struct
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable
+
+from component import (DescriptionComponent, Direction, FloorComponent,
+                       InventoryComponent, LandmarkComponent, OnComponent,
+                       PortalComponent, TakeableComponent,
+                       WorldDescriptionComponent)
+from core import Entity, EntityComponent, EntityIndex, Room, World
+
+# Layout (all integers little-endian):
+#
+#   header   MAGIC, u16 version
+#   sections one per room, then one for the global entities; a section is a
+#            sequence of entities, each a u8 component count followed by
+#            (u8 tag, component data) pairs
+#   table    u32 room count, then per room and for the global section:
+#            u64 offset, u32 length, u32 first entity ID, u32 entity count;
+#            then u32 player ID and i32 current room (-1 if none)
+#   footer   u64 table offset, MAGIC
+#
+# Entities are numbered consecutively in section order, so a reference to
+# an entity is its ID and the section holding it can be found by bisection.
+# An entity moved into a container is written in the container's section.
+# Rooms are referred to by their position in World.rooms.
+
+MAGIC = b'TGSN'
+VERSION = 1
+
+HEADER = struct.Struct('<4sH')
+SECTION = struct.Struct('<QIII')
+TABLE_END = struct.Struct('<Ii')
+FOOTER = struct.Struct('<Q4s')
+
+
+class SnapshotError(Exception):
+
+    def __init__(self, message: str):
+        super().__init__(f'Invalid snapshot: {message}')
+        self.message = message
+
+
+class EntityIds:
+    """
+    IDs of the entities of the loaded sections of a snapshot being written.
+    An entity's ID is the first ID of its section plus its position in it.
+    """
+
+    def __init__(self, rooms: list[Room], first_ids: list[int]):
+        self.rooms = rooms
+        self.first_ids = first_ids
+        self.ids: dict[Entity, int] = {}
+        # Rooms loaded for the section being written, evicted after it
+        self.temporary: list[Room] = []
+
+    def add(self, entities: Iterable[Entity], section: int):
+        first_id = self.first_ids[section]
+        for i, entity in enumerate(entities):
+            self.ids[entity] = first_id + i
+
+    def remove(self, entities: Iterable[Entity]):
+        for entity in entities:
+            del self.ids[entity]
+
+    def evict_temporary(self, resident: set[Room]):
+        for room in self.temporary:
+            if room.loaded and room not in resident:
+                self.remove(room.entities)
+                room.evict()
+        self.temporary.clear()
+
+    def __getitem__(self, entity: Entity) -> int:
+        entity_id = self.ids.get(entity)
+        if entity_id is None:
+            entity_id = self.locate(entity)
+        return entity_id
+
+    def locate(self, entity: Entity) -> int:
+        # Loading a room can load others it refers to, e.g. from a snapshot
+        for section, room in enumerate(self.rooms):
+            if room.loaded and room.entities in entity.observers:
+                self.add(room.entities, section)
+                self.temporary.append(room)
+                return self.ids[entity]
+        raise KeyError(entity)
+
+
+class Writer:
+
+    def __init__(self, world: World, entity_ids: EntityIds,
+                 room_ids: dict[Room, int]):
+        self.world = world
+        self.entity_ids = entity_ids
+        self.room_ids = room_ids
+        self.buffer = bytearray()
+
+    def u8(self, value: int):
+        self.buffer += struct.pack('<B', value)
+
+    def u32(self, value: int):
+        self.buffer += struct.pack('<I', value)
+
+    def string(self, value: str):
+        data = value.encode('utf-8')
+        self.u32(len(data))
+        self.buffer += data
+
+    def entity(self, entity: Entity):
+        try:
+            self.u32(self.entity_ids[entity])
+        except KeyError:
+            raise ValueError('Snapshot references an entity that is not in '
+                             'any room or the world') from None
+
+    def entities(self, entities: Iterable[Entity]):
+        entities = list(entities)
+        self.u32(len(entities))
+        for entity in entities:
+            self.entity(entity)
+
+
+class Reader:
+
+    def __init__(self, buffer: memoryview, resolve: Callable[[int], Entity],
+                 rooms: list[Room]):
+        self.buffer = buffer
+        self.offset = 0
+        self.resolve = resolve
+        self.rooms = rooms
+
+    def unpack(self, fmt: str) -> int:
+        value, = struct.unpack_from(fmt, self.buffer, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def u8(self) -> int:
+        return self.unpack('<B')
+
+    def u32(self) -> int:
+        return self.unpack('<I')
+
+    def string(self) -> str:
+        length = self.u32()
+        value = bytes(self.buffer[self.offset:self.offset + length])
+        self.offset += length
+        return value.decode('utf-8')
+
+    def entities(self) -> list[Entity]:
+        return [self.resolve(self.u32()) for _ in range(self.u32())]
+
+
+def write_description(writer: Writer, component: DescriptionComponent):
+    writer.u32(len(component.names))
+    for name in component.names:
+        writer.string(name)
+    writer.u8(component.description is not None)
+    if component.description is not None:
+        writer.string(component.description)
+
+
+def read_description(reader: Reader) -> DescriptionComponent:
+    names = [reader.string() for _ in range(reader.u32())]
+    description = reader.string() if reader.u8() else None
+    return DescriptionComponent(names, description)
+
+
+def read_inventory(reader: Reader) -> InventoryComponent:
+    component = InventoryComponent()
+    component.items = dict.fromkeys(reader.entities())
+    return component
+
+
+def write_portal(writer: Writer, component: PortalComponent):
+    writer.u32(writer.room_ids[component.room])
+    writer.string(component.direction.value)
+
+
+def read_portal(reader: Reader) -> PortalComponent:
+    room = reader.rooms[reader.u32()]
+    return PortalComponent(room, Direction(reader.string()))
+
+
+@dataclass
+class Codec:
+    tag: int
+    write: Callable[[Writer, EntityComponent], None]
+    read: Callable[[Reader], EntityComponent]
+
+
+# Tags are part of the format: never reuse or renumber one
+CODECS: dict[type, Codec] = {
+    DescriptionComponent:
+    Codec(1, write_description, read_description),
+    WorldDescriptionComponent:
+    Codec(2, lambda writer, component: writer.string(component.description),
+          lambda reader: WorldDescriptionComponent(reader.string())),
+    InventoryComponent:
+    Codec(
+        3, lambda writer, component: writer.entities(
+            writer.world.items(component)), read_inventory),
+    OnComponent:
+    Codec(
+        4, lambda writer, component: writer.entities(
+            writer.world.items(component)),
+        lambda reader: OnComponent(reader.entities())),
+    TakeableComponent:
+    Codec(5, lambda writer, component: None,
+          lambda reader: TakeableComponent()),
+    FloorComponent:
+    Codec(6, lambda writer, component: None, lambda reader: FloorComponent()),
+    PortalComponent:
+    Codec(7, write_portal, read_portal),
+    LandmarkComponent:
+    Codec(
+        8,
+        lambda writer, component: writer.u32(writer.room_ids[component.room]),
+        lambda reader: LandmarkComponent(reader.rooms[reader.u32()])),
+}
+CODECS_BY_TAG = {codec.tag: codec for codec in CODECS.values()}
+
+
+def write_section(writer: Writer, entities: list[Entity]):
+    for entity in entities:
+        writer.u8(len(entity.components))
+        for component in entity.components.values():
+            codec = CODECS.get(type(component))
+            if codec is None:
+                raise ValueError('Cannot snapshot component '
+                                 f'{type(component).__name__}')
+            writer.u8(codec.tag)
+            codec.write(writer, component)
+
+
+class Sections:
+    """
+    Entities of each section of a snapshot being written. An entity moved
+    into a container of another room is written with that room, or with the
+    global entities if a global entity holds it, so that containers only
+    hold entities of their own section or global ones once loaded.
+    """
+
+    def __init__(self, world: World, rooms: list[Room], resident: set[Room]):
+        self.world = world
+        # Only loaded rooms can hold moved entities or containers of them
+        self.sections = {
+            room.entities: section
+            for section, room in enumerate(rooms) if room in resident
+        }
+        self.sections[world.global_entities] = len(rooms)
+        self.moved_in: dict[int, list[Entity]] = {}
+        self.moved_out: set[Entity] = set()
+        for entity, location in world.overlay.locations.items():
+            if location is None or entity in world.global_entities:
+                continue
+            section = self.section_of(entity, set())
+            if section is not None and section != self.own_section(entity):
+                self.moved_out.add(entity)
+                self.moved_in.setdefault(section, []).append(entity)
+
+    def own_section(self, entity: Entity) -> int | None:
+        for index in entity.observers:
+            section = self.sections.get(index)
+            if section is not None:
+                return section
+        return None
+
+    def section_of(self, entity: Entity, seen: set[Entity]) -> int | None:
+        location = self.world.overlay.locations.get(entity)
+        if (location is None or entity in self.world.global_entities
+                or entity in seen):
+            return self.own_section(entity)
+        seen.add(entity)
+        return self.section_of(location[0], seen)
+
+    def entities(self, index: EntityIndex, section: int) -> list[Entity]:
+        return [entity for entity in index if entity not in self.moved_out
+                ] + self.moved_in.get(section, [])
+
+
+def count_sections(rooms: list[Room], resident: set[Room],
+                   sections: Sections) -> list[int]:
+    """
+    First entity ID of every section: the number of entities before it.
+    """
+    ids = [0]
+    for section, room in enumerate(rooms):
+        room.materialize()
+        ids.append(ids[-1] + len(sections.entities(room.entities, section)))
+        if room not in resident:
+            room.evict()
+    return ids
+
+
+def write_snapshot(world: World, file: BinaryIO):
+    """
+    Write a snapshot of world to a binary file, one room at a time. Rooms
+    that are not loaded are loaded only while they are counted and written,
+    so saving leaves no more rooms in memory than it found.
+    """
+    rooms = list(world.rooms)
+    room_ids = {room: i for i, room in enumerate(rooms)}
+    resident = {room for room in rooms if room.loaded}
+    sections = Sections(world, rooms, resident)
+    entity_ids = EntityIds(rooms, count_sections(rooms, resident, sections))
+    for index, section in sections.sections.items():
+        entity_ids.add(sections.entities(index, section), section)
+
+    offset = file.write(HEADER.pack(MAGIC, VERSION))
+    table = bytearray(struct.pack('<I', len(rooms)))
+    for section, room in enumerate([*rooms, None]):
+        if room is None:
+            entities = sections.entities(world.global_entities, section)
+        else:
+            room.materialize()
+            entities = sections.entities(room.entities, section)
+            if room not in resident:
+                entity_ids.add(entities, section)
+                entity_ids.temporary.append(room)
+
+        writer = Writer(world, entity_ids, room_ids)
+        write_section(writer, entities)
+        table += SECTION.pack(offset, len(writer.buffer),
+                              entity_ids.first_ids[section], len(entities))
+        offset += file.write(writer.buffer)
+
+        entity_ids.evict_temporary(resident)
+
+    current_room = -1
+    if world.current_room is not None:
+        current_room = room_ids[world.current_room]
+    table += TABLE_END.pack(entity_ids[world.player], current_room)
+    file.write(table)
+    file.write(FOOTER.pack(offset, MAGIC))
+
+
+def save_snapshot(world: World, path: Path):
+    with path.open('wb') as file:
+        write_snapshot(world, file)
+
+
+class SnapshotReader:
+    """
+    Memory-mapped snapshot. load_world returns a world whose rooms are read
+    from the snapshot the first time they are materialized, and forgotten
+    again when they are evicted.
+    """
+
+    def __init__(self, path: Path):
+        with path.open('rb') as file:
+            self.buffer = memoryview(
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+        if len(self.buffer) < HEADER.size + FOOTER.size:
+            raise SnapshotError('file is truncated')
+        magic, version = HEADER.unpack_from(self.buffer)
+        table_offset, end_magic = FOOTER.unpack_from(
+            self.buffer,
+            len(self.buffer) - FOOTER.size)
+        if magic != MAGIC or end_magic != MAGIC:
+            raise SnapshotError('bad magic number')
+        if version != VERSION:
+            raise SnapshotError(f'unsupported version {version}')
+
+        room_count, = struct.unpack_from('<I', self.buffer, table_offset)
+        self.sections = [
+            SECTION.unpack_from(self.buffer,
+                                table_offset + 4 + i * SECTION.size)
+            for i in range(room_count + 1)
+        ]
+        self.player_id, self.current_room = TABLE_END.unpack_from(
+            self.buffer, table_offset + 4 + (room_count + 1) * SECTION.size)
+        self.first_ids = [section[2] for section in self.sections]
+
+        self.rooms = [
+            Room(loader=partial(self.load_room, i),
+                 unloader=partial(self.unload_room, i))
+            for i in range(room_count)
+        ]
+        self.entities: dict[int, Entity] = {}
+
+    def resolve(self, entity_id: int) -> Entity:
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            section = bisect.bisect_right(self.first_ids, entity_id) - 1
+            if section < len(self.rooms):
+                self.rooms[section].materialize()
+            entity = self.entities.get(entity_id)
+            if entity is None:
+                raise SnapshotError(f'dangling entity reference {entity_id}')
+        return entity
+
+    def read_section(self, section: int) -> list[Entity]:
+        offset, length, first_id, count = self.sections[section]
+        entities = [Entity([]) for _ in range(count)]
+        for i, entity in enumerate(entities):
+            self.entities[first_id + i] = entity
+
+        reader = Reader(self.buffer[offset:offset + length], self.resolve,
+                        self.rooms)
+        for entity in entities:
+            for _ in range(reader.u8()):
+                codec = CODECS_BY_TAG.get(reader.u8())
+                if codec is None:
+                    raise SnapshotError('unknown component tag')
+                entity.add_component(codec.read(reader))
+        return entities
+
+    def load_room(self, section: int, room: Room):
+        for entity in self.read_section(section):
+            room.add_entity(entity)
+
+    def unload_room(self, section: int, _room: Room):
+        _, _, first_id, count = self.sections[section]
+        for entity_id in range(first_id, first_id + count):
+            self.entities.pop(entity_id, None)
+
+    def load_world(self) -> World:
+        global_entities = self.read_section(len(self.rooms))
+        world = World(player=self.entities[self.player_id])
+        for entity in global_entities:
+            world.add_entity(entity)
+        for room in self.rooms:
+            world.add_room(room)
+        if self.current_room >= 0:
+            world.set_room(self.rooms[self.current_room])
+        return world
+
+
+def load_snapshot(path: Path) -> World:
+    return SnapshotReader(path).load_world()
@@ -0,0 +1,160 @@
+from collections import OrderedDict, deque
+from typing import Iterator
+
+from component import Direction, PortalComponent
+from core import (Entity, EntityComponent, EntityIndex, IndexListener, Room,
+                  World, WorldListener)
+
+
+class ExitIndex(IndexListener):
+    """
+    Portals of an EntityIndex by direction, in index order, so that the exit
+    in a direction is found without scanning the portals. The room graphs
+    that read the portals are cleared when a portal is added or removed.
+    """
+
+    def __init__(self, index: EntityIndex):
+        self.portals: dict[Direction, dict[Entity, None]] = {}
+        self.graphs: list[RoomGraph] = []
+        for entity in index.with_component(PortalComponent):
+            self.add(entity, entity[PortalComponent])
+
+    def add(self, entity: Entity, component: PortalComponent):
+        self.portals.setdefault(component.direction, {})[entity] = None
+
+    def discard(self, entity: Entity, component: PortalComponent):
+        portals = self.portals.get(component.direction)
+        if portals is not None:
+            portals.pop(entity, None)
+            if not portals:
+                del self.portals[component.direction]
+
+    def changed(self):
+        for graph in self.graphs:
+            graph.clear()
+
+    def entity_added(self, entity: Entity):
+        component = entity.get(PortalComponent)
+        if component is not None:
+            self.add(entity, component)
+            self.changed()
+
+    def entity_removed(self, entity: Entity):
+        component = entity.get(PortalComponent)
+        if component is not None:
+            self.discard(entity, component)
+            self.changed()
+
+    def component_added(self, entity: Entity, component: EntityComponent):
+        if isinstance(component, PortalComponent):
+            self.add(entity, component)
+            self.changed()
+
+    def component_removed(self, entity: Entity, component: EntityComponent):
+        if isinstance(component, PortalComponent):
+            self.discard(entity, component)
+            self.changed()
+
+    def exit(self, direction: Direction) -> Room | None:
+        portals = self.portals.get(direction)
+        if not portals:
+            return None
+        return next(iter(portals))[PortalComponent].room
+
+    def neighbours(self) -> Iterator[Room]:
+        for portals in self.portals.values():
+            for portal in portals:
+                yield portal[PortalComponent].room
+
+
+class RoomGraph(WorldListener):
+    """
+    Least recently used cache of shortest paths between rooms along their
+    portals, found by breadth-first search and cleared when a portal changes
+    in a room the graph has read. The rooms a search reaches are read once;
+    those that are not loaded are loaded only to read their portals and
+    evicted again, so that searching does not keep rooms in memory. Such a
+    room is checked again when the player enters it, since it is then
+    loaded with a new ExitIndex. Use room_graph to get the graph of a world.
+    """
+
+    max_size = 4096
+
+    def __init__(self, _):
+        self.paths: OrderedDict[tuple[Room, Room],
+                                list[Room] | None] = OrderedDict()
+        self.exits: dict[Room, list[Room]] = {}
+
+    def clear(self):
+        self.paths.clear()
+        self.exits.clear()
+
+    def read(self, room: Room) -> list[Room]:
+        exits = room.entities.listener(ExitIndex)
+        if self not in exits.graphs:
+            exits.graphs.append(self)
+        return list(exits.neighbours())
+
+    def neighbours(self, room: Room) -> list[Room]:
+        neighbours = self.exits.get(room)
+        if neighbours is not None:
+            return neighbours
+        if room.loaded:
+            neighbours = self.read(room)
+        else:
+            room.materialize()
+            neighbours = list(room.entities.listener(ExitIndex).neighbours())
+            room.evict()
+        self.exits[room] = neighbours
+        return neighbours
+
+    def room_changed(self, source: Room | None, destination: Room):
+        # Read while unloaded, or before being evicted and loaded again
+        neighbours = self.exits.get(destination)
+        if neighbours is not None and self.read(destination) != neighbours:
+            self.clear()
+
+    def path(self, source: Room, destination: Room) -> list[Room] | None:
+        """
+        Rooms to pass through to go from source to destination, ending with
+        destination, or None if it cannot be reached.
+        """
+        key = source, destination
+        if key in self.paths:
+            self.paths.move_to_end(key)
+            return self.paths[key]
+        path = self.paths[key] = self.search(source, destination)
+        if len(self.paths) > self.max_size:
+            self.paths.popitem(last=False)
+        return path
+
+    def search(self, source: Room, destination: Room) -> list[Room] | None:
+        previous: dict[Room, Room | None] = {source: None}
+        queue = deque([source])
+        while queue and destination not in previous:
+            room = queue.popleft()
+            for neighbour in self.neighbours(room):
+                if neighbour not in previous:
+                    previous[neighbour] = room
+                    queue.append(neighbour)
+
+        if destination not in previous:
+            return None
+        path = []
+        room = destination
+        while room is not source:
+            path.append(room)
+            room = previous[room]
+        path.reverse()
+        return path
+
+
+def room_graph(world: World) -> RoomGraph:
+    """
+    Get the room graph of a world, shared by its instances, and have it
+    follow this instance's room changes.
+    """
+    graph = world.shared(RoomGraph)
+    if graph not in world.listeners:
+        world.listeners.append(graph)
+    return graph
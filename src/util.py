@@ -1,9 +1,13 @@
-from typing import Type
+import logging
+from collections import OrderedDict
+from typing import Iterable, Iterator, Type
 
 from logzero import logger
 
+import instrumentation
 from component import DescriptionComponent
-from core import Action, Command, Entity, EntityComponent, World
+from core import Action, Command, Entity, EntityComponent, Room, World
+from names import NameIndex
 
 
 class Query:
@@ -16,10 +20,11 @@ class Query:
         return Query(self.world, self.component_classes + [component_class])
 
     def all(self):
-        for entity in self.world.current_entities:
-            if all(component_class in entity
-                   for component_class in self.component_classes):
-                yield entity
+        if not self.component_classes:
+            yield from self.world.current_entities
+            return
+
+        yield from self.world.iter_matching(self.component_classes)
 
     def one(self):
         entity, = self.all()
@@ -28,13 +33,48 @@ class Query:
 
 def lookup_entities(world: World, entity_name: str) -> list[Entity]:
     matching_entities = []
-    for entity in Query(world).has(DescriptionComponent).all():
-        if entity[DescriptionComponent].matches(entity_name):
-            matching_entities.append(entity)
+    for index in world.iter_indices():
+        matching_entities.extend(index.listener(NameIndex).lookup(entity_name))
 
     return matching_entities
 
 
+class NameCache:
+    """
+    Least recently used cache of lookup_entities results, keyed by room and
+    name. An entry stays valid while the versions of the global and room
+    entity indices it was computed from are unchanged. Use World.shared to
+    get the cache of a world.
+    """
+
+    max_size = 4096
+
+    def __init__(self, _):
+        self.entries: OrderedDict[tuple[Room | None, str],
+                                  tuple[int, int,
+                                        list[Entity]]] = OrderedDict()
+
+    def lookup(self, world: World, entity_name: str) -> list[Entity]:
+        room = world.current_room
+        global_version = world.global_entities.version
+        room_version = -1 if room is None else room.entities.version
+        key = room, entity_name
+        entry = self.entries.get(key)
+        if (entry is not None and entry[0] == global_version
+                and entry[1] == room_version):
+            self.entries.move_to_end(key)
+            if instrumentation.active is not None:
+                instrumentation.active.count('name_cache_hits')
+            return entry[2]
+
+        entities = lookup_entities(world, entity_name)
+        self.entries[key] = global_version, room_version, entities
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entities
+
+
 class CommandInterpretationError(Exception):
 
     def __init__(self, message: str):
@@ -42,52 +82,145 @@ class CommandInterpretationError(Exception):
         self.message = message
 
 
-def interpret_command(world: World, command_to_action: list[tuple[Command,
-                                                                  Action]],
-                      command_string: str) -> tuple[Action, list[Entity]]:
-
-    for command, action in command_to_action:
-        entity_names = command.get_entity_names(command_string)
-        if entity_names is None:
-            continue
-
-        logger.info('Command: %s', command)
-        logger.info('Action: %s', action)
-        logger.info('Entity names: %s', entity_names)
-
-        entities = []
-        for entity_name in entity_names:
-            matching_entities = lookup_entities(world, entity_name)
+# A command matching a command string, its action and the entity names
+Candidate = tuple[Command, Action, list[str]]
+
+
+class CommandDispatcher:
+    """
+    Command-to-action table compiled into buckets keyed by the first word of
+    the command string. Parsing a command only tries the commands that can
+    start with its first word, evaluating each distinct command once, and
+    yields matches in table order.
+    """
+
+    def __init__(self, command_to_action: list[tuple[Command, Action]]):
+        self.command_to_action = command_to_action
+
+        fallback = []
+        by_verb: dict[str, list[int]] = {}
+        for i, (command, _) in enumerate(command_to_action):
+            verbs = command.verbs()
+            if verbs is None:
+                fallback.append(i)
+                continue
+            for verb in verbs:
+                by_verb.setdefault(verb, []).append(i)
+
+        self.fallback = [command_to_action[i] for i in fallback]
+        self.by_verb = {
+            verb: [command_to_action[i] for i in sorted(indices + fallback)]
+            for verb, indices in by_verb.items()
+        }
+
+    def candidates(self, command_string: str) -> Iterator[Candidate]:
+        verb = command_string.split(' ', 1)[0]
+        entity_names_by_command: dict[int, list[str] | None] = {}
+        profiler = instrumentation.active
+        for command, action in self.by_verb.get(verb, self.fallback):
+            key = id(command)
+            if key not in entity_names_by_command:
+                if profiler is not None:
+                    start = profiler.clock()
+                entity_names_by_command[key] = command.get_entity_names(
+                    command_string)
+                if profiler is not None:
+                    profiler.add_time('match', start)
+                    profiler.count('regex')
+            names = entity_names_by_command[key]
+            if names is not None:
+                yield command, *command.bind(action, names)
+
+
+def resolve_entities(world: World, entity_names: list[str],
+                     verbose: bool) -> list[Entity]:
+    entities = []
+    names = world.shared(NameCache)
+    for entity_name in entity_names:
+        matching_entities = names.lookup(world, entity_name)
+        if verbose:
             logger.info(
                 'Name %s matched %d entities: %s', entity_name,
                 len(matching_entities),
                 [e[DescriptionComponent].names[0] for e in matching_entities])
-            if len(matching_entities) == 1:
-                entities.extend(matching_entities)
-            elif len(matching_entities) == 0:
-                raise CommandInterpretationError(
-                    'No objects match that description')
-            else:
-                raise CommandInterpretationError(
-                    'Multiple objects match that description')
-
-        entity_specs = action.prerequisites()
-        if len(entity_specs) != len(entities):
-            logger.warning(
-                'Command has %d entities but action expects %d, skipping',
-                len(entities), len(entity_specs))
-            continue
-
-        spec_matches = False
-        for entity_spec, entity in zip(entity_specs, entities):
-            if not entity_spec.matches(entity):
+        if len(matching_entities) == 1:
+            entities.extend(matching_entities)
+        elif len(matching_entities) == 0:
+            raise CommandInterpretationError(
+                'No objects match that description')
+        else:
+            raise CommandInterpretationError(
+                'Multiple objects match that description')
+    return entities
+
+
+# Component masks of the prerequisites of each action class. Prerequisites
+# are static, so they are only built and compiled once per class.
+prerequisite_masks: dict[type, tuple[int, ...]] = {}
+
+
+def compile_prerequisites(action: Action) -> tuple[int, ...]:
+    masks = prerequisite_masks.get(type(action))
+    if masks is None:
+        masks = prerequisite_masks[type(action)] = tuple(
+            entity_spec.mask for entity_spec in action.prerequisites())
+    return masks
+
+
+def matches_prerequisites(action: Action, entities: list[Entity],
+                          verbose: bool) -> bool:
+    masks = compile_prerequisites(action)
+    if len(masks) != len(entities):
+        logger.warning(
+            'Command has %d entities but action expects %d, skipping',
+            len(entities), len(masks))
+        return False
+
+    for i, mask in enumerate(masks):
+        if entities[i].signature & mask != mask:
+            if verbose:
                 logger.info('Entity %s does not match spec %s, skipping',
-                            entity, entity_spec)
-                spec_matches = True
-                break
-        if spec_matches:
-            continue
+                            entities[i],
+                            action.prerequisites()[i])
+            return False
+    return True
 
-        return action, entities
+
+def interpret_command(world: World, dispatcher: CommandDispatcher,
+                      command_string: str) -> tuple[Action, list[Entity]]:
+    return interpret_candidates(world, dispatcher.candidates(command_string))
+
+
+def interpret_candidates(
+        world: World,
+        candidates: Iterable[Candidate]) -> tuple[Action, list[Entity]]:
+    """
+    First candidate whose entity names resolve, in the world, to entities
+    matching its action's prerequisites.
+    """
+    profiler = instrumentation.active
+    # Avoid building log arguments when they would be discarded
+    verbose = logger.isEnabledFor(logging.INFO)
+
+    for command, action, entity_names in candidates:
+        if verbose:
+            logger.info('Command: %s', command)
+            logger.info('Action: %s', action)
+            logger.info('Entity names: %s', entity_names)
+
+        if profiler is None:
+            entities = resolve_entities(world, entity_names, verbose)
+            matches = matches_prerequisites(action, entities, verbose)
+        else:
+            start = profiler.clock()
+            entities = resolve_entities(world, entity_names, verbose)
+            profiler.add_time('lookup', start)
+            start = profiler.clock()
+            matches = matches_prerequisites(action, entities, verbose)
+            profiler.add_time('spec', start)
+            profiler.count('spec_checks')
+
+        if matches:
+            return action, entities
 
     raise CommandInterpretationError('Invalid command.')
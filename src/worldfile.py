@@ -0,0 +1,238 @@
+import json
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+from component import (DescriptionComponent, Direction, FloorComponent,
+                       InventoryComponent, LandmarkComponent, OnComponent,
+                       PortalComponent, TakeableComponent,
+                       WorldDescriptionComponent)
+from core import Entity, EntityComponent, Room, World
+
+# A world file is a JSON object:
+#
+#   {
+#     "start": "<room name>",
+#     "player": <entity>,
+#     "entities": [<entity>, ...],
+#     "rooms": {"<room name>": [<entity>, ...], ...}
+#   }
+#
+# An entity is an object mapping component names to their arguments, plus
+# an optional "id" by which containers in the same room, or global
+# entities, can refer to it. Portals refer to rooms by name.
+
+VERSION = 1
+
+
+class WorldFileError(Exception):
+
+    def __init__(self, message: str):
+        super().__init__(f'Invalid world file: {message}')
+        self.message = message
+
+
+Resolve = Callable[[str], Entity]
+
+
+@dataclass
+class ComponentType:
+    """
+    How to build a component from its arguments in a world file. Builders
+    raise KeyError, TypeError or ValueError for malformed arguments.
+    """
+    build: Callable[[Any, Resolve, dict[str, Room]], EntityComponent]
+    references: Callable[[Any], list[str]] = lambda args: []
+    rooms: Callable[[Any], list[str]] = lambda args: []
+
+
+def text(args: Any) -> str:
+    if not isinstance(args, str):
+        raise TypeError('Expected a string')
+    return args
+
+
+def texts(args: Any) -> list[str]:
+    if not isinstance(args, list):
+        raise TypeError('Expected a list')
+    return [text(arg) for arg in args]
+
+
+def build_description(args: dict, resolve: Resolve,
+                      rooms: dict[str, Room]) -> DescriptionComponent:
+    del resolve, rooms
+    names = texts(args['names'])
+    if not names:
+        raise ValueError('An entity needs at least one name')
+    description = args.get('description')
+    return DescriptionComponent(
+        names, None if description is None else text(description))
+
+
+def build_inventory(args: list[str], resolve: Resolve,
+                    rooms: dict[str, Room]) -> InventoryComponent:
+    del rooms
+    component = InventoryComponent()
+    component.items = dict.fromkeys(map(resolve, args))
+    return component
+
+
+COMPONENT_TYPES: dict[str, ComponentType] = {
+    'description':
+    ComponentType(build_description),
+    'world_description':
+    ComponentType(
+        lambda args, resolve, rooms: WorldDescriptionComponent(text(args))),
+    'inventory':
+    ComponentType(build_inventory, references=texts),
+    'on':
+    ComponentType(lambda args, resolve, rooms: OnComponent(map(resolve, args)),
+                  references=texts),
+    'takeable':
+    ComponentType(lambda args, resolve, rooms: TakeableComponent()),
+    'floor':
+    ComponentType(lambda args, resolve, rooms: FloorComponent()),
+    'portal':
+    ComponentType(lambda args, resolve, rooms: PortalComponent(
+        rooms[args['room']], Direction(args['direction'])),
+                  rooms=lambda args: [text(args['room'])]),
+    'landmark':
+    ComponentType(lambda args, resolve, rooms: LandmarkComponent(rooms[args]),
+                  rooms=lambda args: [text(args)]),
+}
+
+
+def build_entities(definitions: list[dict], rooms: dict[str, Room],
+                   scope: dict[str, Entity]) -> list[Entity]:
+    """
+    Create the entities of a room or of the world. Ids are bound in scope
+    before any component is built, so references may point forwards.
+    """
+    entities = [Entity([]) for _ in definitions]
+    for definition, entity in zip(definitions, entities):
+        if 'id' in definition:
+            scope[definition['id']] = entity
+    for definition, entity in zip(definitions, entities):
+        for name, args in definition.items():
+            if name != 'id':
+                entity.add_component(COMPONENT_TYPES[name].build(
+                    args, scope.__getitem__, rooms))
+    return entities
+
+
+def check_entities(definitions: Any, rooms: dict[str, Room], scope: set[str],
+                   where: str):
+    """
+    Check that definitions can be built by build_entities, given the rooms
+    and the ids bound outside them, by building every component with
+    placeholders for the entities it refers to.
+    """
+    if not isinstance(definitions, list) or not all(
+            isinstance(definition, dict) for definition in definitions):
+        raise WorldFileError(f'{where} must be a list of objects')
+    ids = set(scope)
+    for definition in definitions:
+        if 'id' in definition:
+            if not isinstance(definition['id'], str):
+                raise WorldFileError(f'id {definition["id"]} in {where} '
+                                     'is not a string')
+            ids.add(definition['id'])
+
+    for definition in definitions:
+        for name, args in definition.items():
+            if name != 'id':
+                check_component(name, args, rooms, ids, f'{name} in {where}')
+
+
+def check_component(name: str, args: Any, rooms: dict[str, Room],
+                    ids: set[str], where: str):
+    component_type = COMPONENT_TYPES.get(name)
+    if component_type is None:
+        raise WorldFileError(f'unknown component {where}')
+    try:
+        references = component_type.references(args)
+        room_names = component_type.rooms(args)
+    except (KeyError, TypeError, ValueError) as err:
+        raise WorldFileError(f'invalid {where}') from err
+    for reference in references:
+        if reference not in ids:
+            raise WorldFileError(f'unknown entity {reference} in {where}')
+    for room in room_names:
+        if room not in rooms:
+            raise WorldFileError(f'unknown room {room} in {where}')
+    try:
+        component_type.build(args, lambda _: Entity([]), rooms)
+    except (KeyError, TypeError, ValueError) as err:
+        raise WorldFileError(f'invalid {where}') from err
+
+
+class WorldDefinition:
+    """
+    A parsed world file, checked as a whole when it is created. Each call to
+    make_world builds a fresh world whose rooms are empty until first
+    entered.
+    """
+
+    def __init__(self, data: Any):
+        if not isinstance(data, dict):
+            raise WorldFileError('a world must be an object')
+        if data.get('version', VERSION) != VERSION:
+            raise WorldFileError(f'unsupported version {data["version"]}')
+        self.data = data
+        rooms = data.get('rooms', {})
+        if not isinstance(rooms, dict):
+            raise WorldFileError('rooms must be an object')
+        start = data.get('start')
+        if not isinstance(start, str) or start not in rooms:
+            raise WorldFileError('start is not a room')
+        if 'player' not in data:
+            raise WorldFileError('there is no player')
+
+        # Placeholder rooms for the checks, which build every component
+        placeholders = {name: Room() for name in rooms}
+        entities = data.get('entities', [])
+        if not isinstance(entities, list):
+            raise WorldFileError('entities must be a list')
+        entities = [data['player'], *entities]
+        check_entities(entities, placeholders, set(), 'global entities')
+        self.global_ids = {
+            definition['id']
+            for definition in entities if 'id' in definition
+        }
+        for name, definitions in rooms.items():
+            check_entities(definitions, placeholders, self.global_ids,
+                           f'room {name}')
+
+    @classmethod
+    def load(cls, path: Path) -> 'WorldDefinition':
+        with path.open(encoding='utf-8') as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as err:
+                raise WorldFileError(str(err)) from err
+        return cls(data)
+
+    def make_world(self) -> World:
+        rooms: dict[str, Room] = {}
+        scope: dict[str, Entity] = {}
+
+        def load_room(name: str, room: Room):
+            definitions = self.data['rooms'][name]
+            for entity in build_entities(definitions, rooms, dict(scope)):
+                room.add_entity(entity)
+
+        for name in self.data['rooms']:
+            rooms[name] = Room(loader=partial(load_room, name))
+
+        player, *entities = build_entities(
+            [self.data['player'], *self.data.get('entities', [])], rooms,
+            scope)
+
+        world = World(player=player)
+        for entity in entities:
+            world.add_entity(entity)
+        for room in rooms.values():
+            world.add_room(room)
+        world.set_room(rooms[self.data['start']])
+        return world
@@ -0,0 +1,170 @@
+import math
+import random
+from dataclasses import dataclass
+from functools import partial
+from typing import Iterator
+
+from component import (DescriptionComponent, Direction, FloorComponent,
+                       InventoryComponent, LandmarkComponent, OnComponent,
+                       PortalComponent, TakeableComponent,
+                       WorldDescriptionComponent)
+from core import Entity, Room, World
+
+ADJECTIVES = [
+    'rusty', 'old', 'small', 'large', 'red', 'blue', 'wooden', 'iron',
+    'golden', 'dusty', 'broken', 'shiny'
+]
+NOUNS = [
+    'key', 'coin', 'book', 'lamp', 'sword', 'cup', 'box', 'rope', 'map',
+    'ring', 'bottle', 'candle'
+]
+CONTAINERS = ['table', 'chest', 'shelf', 'crate', 'desk']
+
+
+@dataclass
+class WorldShape:
+    """
+    Parameters of a generated world. Rooms are laid out on a square grid
+    and connected by portals between grid neighbours: every row is a
+    corridor, the first column joins the rows, and other neighbours are
+    linked with probability extra_link_rate.
+    """
+    rooms: int = 100
+    entities_per_room: int = 50
+    containers_per_room: int = 3
+    container_depth: int = 2
+    extra_link_rate: float = 0.3
+    name_collision_rate: float = 0.1
+    seed: int = 0
+
+    @property
+    def width(self) -> int:
+        return max(1, math.isqrt(self.rooms - 1) + 1)
+
+
+def make_rng(shape: WorldShape, *keys: int) -> random.Random:
+    # Seeding with a string hashes it with SHA-512, which unlike hash() is
+    # the same on every interpreter and platform
+    return random.Random(f'{shape.seed}:{keys}')
+
+
+def neighbours(shape: WorldShape,
+               index: int) -> Iterator[tuple[Direction, int]]:
+    width = shape.width
+    for direction, other in ((Direction.N, index - width), (Direction.S,
+                                                            index + width),
+                             (Direction.W, index - 1), (Direction.E,
+                                                        index + 1)):
+        if not 0 <= other < shape.rooms:
+            continue
+        if direction in (Direction.W, Direction.E):
+            if other // width == index // width:
+                yield direction, other
+            continue
+        link_rng = make_rng(shape, min(index, other), max(index, other))
+        if index % width == 0 or link_rng.random() < shape.extra_link_rate:
+            yield direction, other
+
+
+def add_items(shape: WorldShape, rng: random.Random, room: Room,
+              containers: list[dict[Entity, None]], count: int):
+    names: list[str] = []
+    for i in range(count):
+        if names and rng.random() < shape.name_collision_rate:
+            name = rng.choice(names)
+        else:
+            name = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}'
+            names.append(name)
+        item = Entity([
+            DescriptionComponent(names=[name]),
+            TakeableComponent(),
+        ])
+        rng.choice(containers)[item] = None
+        room.add_entity(item)
+
+
+def populate_room(shape: WorldShape, rooms: list[Room], index: int):
+    """
+    Fill in the contents of rooms[index]. Contents depend only on the shape
+    and the index, so rooms can be populated lazily and in any order.
+    """
+    rng = make_rng(shape, index)
+    room = rooms[index]
+    entities = 2
+
+    floor_items: dict[Entity, None] = {}
+    room.add_entity(
+        Entity([
+            WorldDescriptionComponent(
+                f'You are in room {index}. It is '
+                f'{rng.choice(ADJECTIVES)} and {rng.choice(ADJECTIVES)}.')
+        ]))
+
+    for direction, other in neighbours(shape, index):
+        room.add_entity(
+            Entity([
+                DescriptionComponent(names=[f'{direction.value} door']),
+                PortalComponent(room=rooms[other], direction=direction),
+            ]))
+        entities += 1
+
+    containers: list[tuple[dict[Entity, None], int]] = [(floor_items, 0)]
+    for i in range(
+            min(shape.containers_per_room,
+                shape.entities_per_room - entities)):
+        on_component = OnComponent()
+        container = Entity([
+            DescriptionComponent(names=[f'{rng.choice(CONTAINERS)} {i}']),
+            on_component,
+        ])
+        parent, depth = rng.choice([(parent, depth)
+                                    for parent, depth in containers
+                                    if depth < shape.container_depth])
+        parent[container] = None
+        room.add_entity(container)
+        containers.append((on_component.items, depth + 1))
+        entities += 1
+
+    add_items(shape, rng, room, [items for items, _ in containers],
+              shape.entities_per_room - entities)
+
+    room.add_entity(
+        Entity([
+            DescriptionComponent(names=['floor', 'ground']),
+            OnComponent(floor_items),
+            FloorComponent(),
+        ]))
+
+
+def generate_rooms(shape: WorldShape) -> list[Room]:
+    """
+    Create the rooms of a world, each populated when first used, so that
+    they can be evicted and populated again.
+    """
+    rooms: list[Room] = []
+
+    def load_room(index: int, _room: Room):
+        populate_room(shape, rooms, index)
+
+    rooms.extend(
+        Room(loader=partial(load_room, index)) for index in range(shape.rooms))
+    return rooms
+
+
+def generate_world(shape: WorldShape | None = None) -> World:
+    shape = shape if shape is not None else WorldShape()
+    world = World(player=Entity([
+        InventoryComponent(),
+        DescriptionComponent(names=['player', 'me', 'self', 'myself'],
+                             description="It's just you")
+    ]))
+    rooms = generate_rooms(shape)
+    for index, room in enumerate(rooms):
+        world.add_room(room)
+        world.add_entity(
+            Entity([
+                DescriptionComponent(names=[f'room {index}']),
+                LandmarkComponent(room),
+            ]))
+    world.set_room(rooms[0])
+    return world
@@ -0,0 +1,158 @@
+import json
+import re
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+import command
+from action import TakeAction
+from command import (TRANSLATOR_KEY, PatternCommand, leading_words,
+                     load_pattern_cache, save_pattern_cache)
+from main import make_command_to_action
+from util import CommandDispatcher
+
+ARGUMENTS = {
+    '<item>': ['key', 'the iron key'],
+    '<count>': ['3', '12'],
+}
+
+
+def expand(pattern: str) -> Iterator[str]:
+    """
+    Command strings matching a PatternCommand pattern, trying every
+    alternative and both with and without each optional part.
+    """
+    if not pattern:
+        yield ''
+        return
+    if pattern.startswith('['):
+        end = pattern.index(']')
+        for rest in expand(pattern[end + 1:]):
+            yield rest
+            for optional in expand(pattern[1:end]):
+                yield optional + rest
+        return
+    token, rest = re.match(r'([^ \[]*)(.*)', pattern).groups()
+    if rest.startswith(' '):
+        token, rest = token + ' ', rest[1:]
+    alternatives = ARGUMENTS.get(token.strip(), token.split('|'))
+    space = ' ' if token.endswith(' ') else ''
+    for alternative in alternatives:
+        for expanded_rest in expand(rest):
+            yield (alternative.strip().replace('_', ' ') + space +
+                   expanded_rest)
+
+
+def command_strings() -> list[str]:
+    strings = {'', 'xyzzy', 'go', 'look  around', 'TAKE key'}
+    for command, _ in make_command_to_action():
+        strings.update(expand(command.syntax))
+    return sorted(strings)
+
+
+def linear_candidates(command_to_action, command_string: str) -> list:
+    candidates = []
+    for command, action in command_to_action:
+        names = command.get_entity_names(command_string)
+        if names is not None:
+            candidates.append((command, *command.bind(action, names)))
+    return candidates
+
+
+def same(candidates: list, expected: list) -> bool:
+    # Actions bound to a count are made anew for every match
+    return [(command, type(action), vars(action), names)
+            for command, action, names in candidates
+            ] == [(command, type(action), vars(action), names)
+                  for command, action, names in expected]
+
+
+def test_dispatcher_matches_linear_scan():
+    command_to_action = make_command_to_action()
+    dispatcher = CommandDispatcher(command_to_action)
+    strings = command_strings()
+    assert len(strings) > 100
+    for command_string in strings:
+        assert same(list(dispatcher.candidates(command_string)),
+                    linear_candidates(command_to_action, command_string))
+
+
+def test_every_pattern_is_reachable():
+    command_to_action = make_command_to_action()
+    dispatcher = CommandDispatcher(command_to_action)
+    for command, _ in command_to_action:
+        for command_string in expand(command.syntax):
+            assert any(candidate[0] is command
+                       for candidate in dispatcher.candidates(command_string))
+
+
+@pytest.mark.parametrize('pattern, words', [
+    ('take|pick_up <item>', {'take', 'pick'}),
+    ('[move|go ]n|north', {'move', 'go', 'n', 'north'}),
+    ('[un]lock <item>', None),
+    ('<item>', None),
+])
+def test_leading_words(pattern: str, words: set[str] | None):
+    assert leading_words(pattern) == words
+
+
+def test_optional_prefix_of_verb():
+    command = PatternCommand('[un]lock <item>')
+    dispatcher = CommandDispatcher([(command, TakeAction())])
+    for command_string in ('unlock door', 'lock door'):
+        candidates = list(dispatcher.candidates(command_string))
+        assert [names for _, _, names in candidates] == [['door']]
+
+
+@pytest.fixture(name='empty_pattern_caches')
+def fixture_empty_pattern_caches(monkeypatch):
+    monkeypatch.setattr(command, 'compiled_patterns', {})
+    monkeypatch.setattr(command, 'translated_patterns', {})
+
+
+def write_pattern_cache(path: Path, translator: str, patterns: dict):
+    with path.open('w', encoding='utf-8') as file:
+        json.dump({'translator': translator, 'patterns': patterns}, file)
+
+
+@pytest.mark.usefixtures('empty_pattern_caches')
+def test_pattern_cache_round_trip(tmp_path: Path):
+    path = tmp_path / 'patterns.json'
+    translated = PatternCommand('[un]lock|open <item>').command.pattern
+    save_pattern_cache(path)
+    command.translated_patterns.clear()
+    command.compiled_patterns.clear()
+
+    load_pattern_cache(path)
+    assert command.translated_patterns == {
+        '[un]lock|open <item>': (translated.pattern, None)
+    }
+    assert translated.pattern in command.compiled_patterns
+
+
+@pytest.mark.usefixtures('empty_pattern_caches')
+@pytest.mark.parametrize('translator, patterns', [
+    (TRANSLATOR_KEY, {
+        'inventory|i': '(inventory'
+    }),
+    (TRANSLATOR_KEY, {
+        'inventory|i': ['inventory']
+    }),
+    (TRANSLATOR_KEY, ['inventory|i']),
+    ('other rules', {
+        'inventory|i': 'x'
+    }),
+])
+def test_pattern_cache_miss(tmp_path: Path, translator: str, patterns):
+    path = tmp_path / 'patterns.json'
+    write_pattern_cache(path, translator, patterns)
+    load_pattern_cache(path)
+    assert not command.translated_patterns
+    assert PatternCommand('inventory|i').get_entity_names('i') == []
+
+
+@pytest.mark.usefixtures('empty_pattern_caches')
+def test_pattern_cache_missing_file(tmp_path: Path):
+    load_pattern_cache(tmp_path / 'patterns.json')
+    assert not command.translated_patterns
@@ -0,0 +1,106 @@
+import pytest
+
+from component import InventoryComponent, OnComponent
+from core import Entity, World
+from journal import Journal
+from main import make_command_to_action, make_world
+from output import CollectingSink
+from render import render_cache
+from session import Session
+from travel import RoomGraph
+from util import CommandDispatcher, NameCache, lookup_entities
+
+
+@pytest.fixture(name='template')
+def fixture_template() -> World:
+    return make_world()
+
+
+def start(world: World) -> Session:
+    session = Session(world.instantiate(CollectingSink()),
+                      CommandDispatcher(make_command_to_action()))
+    session.start()
+    session.world.output.take()
+    return session
+
+
+def run(session: Session, command_string: str) -> str:
+    session.run(command_string)
+    return session.world.output.take()
+
+
+def find(world: World, name: str) -> Entity:
+    entity, = lookup_entities(world, name)
+    return entity
+
+
+def test_moves_are_per_instance(template: World):
+    first, second = start(template), start(template)
+    key = find(template, 'key')
+    floor = find(template, 'floor')
+
+    run(first, 'take key')
+    assert first.world.container_of(key) is first.world.player
+    assert second.world.container_of(key) is floor
+    assert template.container_of(key) is floor
+    assert key in second.world.items(floor[OnComponent])
+    assert key in template.items(floor[OnComponent])
+    assert not second.world.items(template.player[InventoryComponent])
+
+    run(second, 'take key')
+    run(second, 'drop key')
+    assert first.world.container_of(key) is first.world.player
+    assert template.items(template.player[InventoryComponent]) == {}
+
+
+def test_rooms_are_per_instance(template: World):
+    plain = template.current_room
+    first, second = start(template), start(template)
+    run(first, 'e')
+    assert first.world.current_room is not plain
+    assert second.world.current_room is plain
+    assert template.current_room is plain
+
+
+def test_instance_of_instance(template: World):
+    first = start(template)
+    run(first, 'take key')
+    second = start(first.world)
+    key = find(template, 'key')
+
+    # An instance starts from the state of the world it was made from
+    assert second.world.container_of(key) is second.world.player
+    run(second, 'drop key')
+    assert first.world.container_of(key) is first.world.player
+
+
+def test_derived_caches_are_shared(template: World):
+    first, second = start(template), start(template)
+    for cache_class in (NameCache, RoomGraph):
+        assert first.world.shared(cache_class) is template.shared(cache_class)
+        assert second.world.shared(cache_class) is template.shared(cache_class)
+
+
+def test_render_cache_is_per_instance(template: World):
+    first, second = start(template), start(template)
+    assert render_cache(first.world) is not render_cache(second.world)
+    assert 'iron key' in run(first, 'look')
+    assert 'iron key' in run(second, 'look')
+
+    run(first, 'take key')
+    assert 'iron key' not in run(first, 'look')
+    assert 'iron key' in run(second, 'look')
+    assert run(second, 'i') == 'Your inventory is empty\n'
+
+
+def test_journal_is_per_instance(template: World):
+    first, second = start(template), start(template)
+    assert first.world.find_listener(Journal) is first.journal
+    assert second.world.find_listener(Journal) is second.journal
+    assert template.find_listener(Journal) is None
+
+    run(first, 'take key')
+    assert run(second, 'undo') == 'There is nothing to undo.\n'
+    assert run(first, 'undo') == 'Undone.\n'
+    assert run(first, 'redo') == 'Redone.\n'
+    assert run(second, 'redo') == 'There is nothing to redo.\n'
@@ -0,0 +1,206 @@
+import pytest
+
+from action import TakeAction, WaitAction
+from component import InventoryComponent, OnComponent
+from core import Entity, World
+from journal import Journal
+from main import make_command_to_action
+from output import CollectingSink
+from session import Session
+from util import CommandDispatcher, lookup_entities
+from worldfile import WorldDefinition
+
+WORLD = {
+    'start': 'hall',
+    'player': {'inventory': [], 'description': {'names': ['player']}},
+    'entities': [
+        {'description': {'names': ['hall']}, 'landmark': 'hall'},
+        {'description': {'names': ['cellar']}, 'landmark': 'cellar'},
+    ],
+    'rooms': {
+        'hall': [
+            {'world_description': 'A hall.'},
+            {
+                'id': 'key',
+                'description': {'names': ['iron key']},
+                'takeable': True,
+            },
+            {'description': {'names': ['table']}, 'on': []},
+            {
+                'description': {'names': ['floor']},
+                'on': ['key'],
+                'floor': True,
+            },
+            {
+                'description': {'names': ['hall door']},
+                'portal': {'room': 'corridor', 'direction': 'east'},
+            },
+        ],
+        'corridor': [
+            {'world_description': 'A corridor.'},
+            {
+                'description': {'names': ['cellar door']},
+                'portal': {'room': 'cellar', 'direction': 'east'},
+            },
+        ],
+        'cellar': [{'world_description': 'A cellar.'}],
+    },
+}
+
+
+def make_session(history: int = 100) -> Session:
+    world = WorldDefinition(WORLD).make_world()
+    world.output = CollectingSink()
+    session = Session(world, CommandDispatcher(make_command_to_action()),
+                      history)
+    session.start()
+    world.output.take()
+    return session
+
+
+@pytest.fixture(name='session')
+def fixture_session() -> Session:
+    return make_session()
+
+
+def run(session: Session, command_string: str) -> str:
+    session.run(command_string)
+    return session.world.output.take()
+
+
+def find(world: World, name: str) -> Entity:
+    entity, = lookup_entities(world, name)
+    return entity
+
+
+def carried(world: World, entity: Entity) -> bool:
+    return entity in world.items(world.player[InventoryComponent])
+
+
+def test_undo_redo_take(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    floor = find(world, 'floor')
+    run(session, 'take key')
+
+    assert run(session, 'undo') == 'Undone.\n'
+    assert not carried(world, key)
+    assert world.container_of(key) is floor
+    assert run(session, 'redo') == 'Redone.\n'
+    assert carried(world, key)
+    assert world.container_of(key) is world.player
+
+
+def test_undo_redo_drop(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    floor = find(world, 'floor')
+    run(session, 'take key')
+    run(session, 'drop key')
+
+    run(session, 'undo')
+    assert carried(world, key)
+    run(session, 'redo')
+    assert key in world.items(floor[OnComponent])
+    assert world.container_of(key) is floor
+
+
+def test_undo_redo_put_on(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    table = find(world, 'table')
+    run(session, 'take key')
+    assert run(session,
+               'put key on table') == 'You put the iron key on the table.\n'
+
+    run(session, 'undo')
+    assert carried(world, key)
+    assert key not in world.items(table[OnComponent])
+    run(session, 'redo')
+    assert key in world.items(table[OnComponent])
+    assert world.container_of(key) is table
+
+
+def test_undo_redo_go_to(session: Session):
+    world = session.world
+    hall = world.current_room
+    run(session, 'go to cellar')
+    cellar = world.current_room
+    assert cellar is not hall
+
+    # The journey through the corridor is one entry
+    assert run(session, 'undo') == ('Undone.\nA hall.\n'
+                                    'There is an iron key here.\n')
+    assert world.current_room is hall
+    assert run(session, 'undo') == 'There is nothing to undo.\n'
+    assert run(session, 'redo') == 'Redone.\nA cellar.\n'
+    assert world.current_room is cellar
+
+
+def test_new_command_clears_redo(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    run(session, 'take key')
+    run(session, 'undo')
+    run(session, 'e')
+
+    assert run(session, 'redo') == 'There is nothing to redo.\n'
+    run(session, 'undo')
+    assert run(session, 'undo') == 'There is nothing to undo.\n'
+    assert not carried(world, key)
+
+
+def test_commands_without_changes_keep_redo(session: Session):
+    run(session, 'take key')
+    run(session, 'undo')
+    run(session, 'look')
+    run(session, 'z')
+
+    assert run(session, 'redo') == 'Redone.\n'
+    assert carried(session.world, find(session.world, 'key'))
+
+
+def test_history_bound():
+    session = make_session(history=2)
+    world = session.world
+    hall = world.current_room
+    run(session, 'take key')
+    run(session, 'e')
+    run(session, 'e')
+
+    run(session, 'undo')
+    run(session, 'undo')
+    assert run(session, 'undo') == 'There is nothing to undo.\n'
+    # The oldest entry was dropped, so the key stays taken
+    assert world.current_room is hall
+    assert carried(world, find(world, 'key'))
+
+
+def test_no_history():
+    session = make_session(history=0)
+    run(session, 'take key')
+    assert run(session, 'undo') == 'There is nothing to undo.\n'
+    assert carried(session.world, find(session.world, 'key'))
+
+
+def test_rewind_only_latest_entry_of_action(session: Session):
+    world = session.world
+    journal = world.find_listener(Journal)
+    key = find(world, 'key')
+    table = find(world, 'table')
+    take = TakeAction()
+
+    take.apply(world, [key])
+    journal.commit(take)
+    world.move_entity(key, table, OnComponent)
+    journal.commit(WaitAction())
+
+    # The latest entry belongs to another action, so nothing is undone
+    assert not take.rewind(world)
+    assert world.container_of(key) is table
+    assert len(journal.history) == 2
+
+    journal.undo()
+    assert take.rewind(world)
+    assert world.container_of(key) is find(world, 'floor')
+    assert not take.rewind(world)
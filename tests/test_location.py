@@ -0,0 +1,73 @@
+import pytest
+
+from component import DescriptionComponent, InventoryComponent, OnComponent
+from core import ContainmentIndex, Entity, World
+from roomcache import RoomCache
+from util import lookup_entities
+from worldfile import WorldDefinition
+
+# The lamp is a global entity lying on the floor of the hall
+WORLD = {
+    'start': 'hall',
+    'player': {'inventory': [], 'description': {'names': ['player']}},
+    'entities': [{'id': 'lamp', 'description': {'names': ['lamp']}}],
+    'rooms': {
+        'hall': [{
+            'description': {'names': ['floor']},
+            'on': ['lamp'],
+            'floor': True,
+        }],
+        'cellar': [],
+    },
+}
+
+
+@pytest.fixture(name='world')
+def fixture_world() -> World:
+    return WorldDefinition(WORLD).make_world()
+
+
+def find(world: World, name: str) -> Entity:
+    entity, = lookup_entities(world, name)
+    return entity
+
+
+def floor_of(world: World) -> Entity:
+    hall, _ = world.rooms
+    floor, = hall.entities.with_component(OnComponent)
+    return floor
+
+
+def test_global_entity_in_room(world: World):
+    lamp = find(world, 'lamp')
+    floor = floor_of(world)
+    assert world.container_of(lamp) is floor
+    # Found from the global index, without searching the rooms
+    locations = world.global_entities.listener(ContainmentIndex).locations
+    assert locations[lamp] == (floor, floor[OnComponent])
+
+
+def test_global_entity_moved_out_of_scope(world: World):
+    _, cellar = world.rooms
+    lamp = find(world, 'lamp')
+    floor = floor_of(world)
+    world.set_room(cellar)
+    world.move_entity(lamp, world.player, InventoryComponent)
+    assert world.container_of(lamp) is world.player
+    assert world.items(floor[OnComponent]) == {}
+    assert world.items(world.player[InventoryComponent]) == {lamp: None}
+
+
+def test_global_entity_in_reloaded_room(world: World):
+    hall, cellar = world.rooms
+    lamp = find(world, 'lamp')
+    RoomCache(world, 0)
+    world.set_room(cellar)
+    assert not hall.loaded
+    assert world.container_of(lamp) is None
+
+    world.set_room(hall)
+    floor = floor_of(world)
+    assert world.container_of(lamp) is floor
+    lamp.add_component(DescriptionComponent(['oil lamp']))
+    assert world.container_of(lamp) is floor
@@ -0,0 +1,117 @@
+import pytest
+
+from component import DescriptionComponent, InventoryComponent
+from core import Entity, Room, World
+from util import NameCache
+
+
+def described(*names: str) -> Entity:
+    return Entity([DescriptionComponent(names=list(names))])
+
+
+@pytest.fixture(name='world')
+def make_world() -> World:
+    world = World(player=Entity(
+        [InventoryComponent(),
+         DescriptionComponent(names=['player'])]))
+    for name in ('hall', 'cellar'):
+        room = Room()
+        room.add_entity(described(f'{name} lamp'))
+        world.add_room(room)
+    world.set_room(next(iter(world.rooms)))
+    return world
+
+
+def lookup(world: World, name: str) -> list[Entity]:
+    return world.shared(NameCache).lookup(world, name)
+
+
+def names(entities: list[Entity]) -> list[str]:
+    return [entity[DescriptionComponent].names[0] for entity in entities]
+
+
+def test_repeated_lookup_is_cached(world: World):
+    assert lookup(world, 'lamp') is lookup(world, 'lamp')
+
+
+def test_added_entity_is_found(world: World):
+    assert names(lookup(world, 'coin')) == []
+    world.current_room.add_entity(described('gold coin'))
+    assert names(lookup(world, 'coin')) == ['gold coin']
+    world.add_entity(described('silver coin'))
+    assert names(lookup(world, 'coin')) == ['silver coin', 'gold coin']
+
+
+def test_removed_entity_is_not_found(world: World):
+    lamp, = lookup(world, 'lamp')
+    world.current_room.remove_entity(lamp)
+    assert lookup(world, 'lamp') == []
+
+    narrator = described('narrator')
+    world.add_entity(narrator)
+    assert lookup(world, 'narrator') == [narrator]
+    world.remove_entity(narrator)
+    assert lookup(world, 'narrator') == []
+
+
+def test_replaced_description_is_used(world: World):
+    lamp, = lookup(world, 'lamp')
+    lamp.add_component(DescriptionComponent(names=['broken torch']))
+    assert lookup(world, 'lamp') == []
+    assert lookup(world, 'torch') == [lamp]
+
+    lamp.remove_component(DescriptionComponent)
+    assert lookup(world, 'torch') == []
+
+
+def test_room_change(world: World):
+    hall, cellar = world.rooms
+    assert names(lookup(world, 'lamp')) == ['hall lamp']
+    world.set_room(cellar)
+    assert names(lookup(world, 'lamp')) == ['cellar lamp']
+    world.set_room(hall)
+    assert names(lookup(world, 'lamp')) == ['hall lamp']
+
+
+def test_evicted_room_is_looked_up_again(world: World):
+    loads = []
+
+    def load(room: Room):
+        lamp = described('attic lamp')
+        loads.append(lamp)
+        room.add_entity(lamp)
+
+    attic = Room(loader=load)
+    world.add_room(attic)
+    world.set_room(attic)
+    assert lookup(world, 'lamp') == [loads[0]]
+
+    hall = next(iter(world.rooms))
+    world.set_room(hall)
+    attic.evict()
+    world.set_room(attic)
+    assert len(loads) == 2
+    assert lookup(world, 'lamp') == [loads[1]]
+
+
+def test_instances_share_the_cache(world: World):
+    instance = world.instantiate()
+    assert instance.shared(NameCache) is world.shared(NameCache)
+    _, cellar = world.rooms
+    instance.set_room(cellar)
+    assert names(lookup(instance, 'lamp')) == ['cellar lamp']
+    assert names(lookup(world, 'lamp')) == ['hall lamp']
+
+
+def test_size_is_bounded(world: World, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(NameCache, 'max_size', 3)
+    cache = world.shared(NameCache)
+    for name in ('lamp', 'hall', 'player', 'coin'):
+        cache.lookup(world, name)
+    assert len(cache.entries) == 3
+
+    # Using an entry makes it the most recently used
+    cache.lookup(world, 'hall')
+    cache.lookup(world, 'rope')
+    cached = {name for _, name in cache.entries}
+    assert cached == {'coin', 'hall', 'rope'}
@@ -0,0 +1,169 @@
+import pytest
+
+from action import TakeAction
+from component import DescriptionComponent
+from core import Entity, World
+from main import make_command_to_action
+from output import CollectingSink
+from render import render_cache
+from scheduler import scheduler_of
+from session import Session
+from util import CommandDispatcher, lookup_entities
+from worldfile import WorldDefinition
+
+WORLD = {
+    'start': 'hall',
+    'player': {'inventory': [], 'description': {'names': ['player']}},
+    'rooms': {
+        'hall': [
+            {'world_description': 'A hall.'},
+            {
+                'id': 'key',
+                'description': {'names': ['iron key']},
+                'takeable': True,
+            },
+            {'description': {'names': ['table']}, 'on': []},
+            {
+                'description': {'names': ['floor']},
+                'on': ['key'],
+                'floor': True,
+            },
+            {
+                'description': {'names': ['door']},
+                'portal': {'room': 'cellar', 'direction': 'east'},
+            },
+        ],
+        'cellar': [{'world_description': 'A cellar.'}],
+    },
+}
+
+
+@pytest.fixture(name='session')
+def fixture_session() -> Session:
+    world = WorldDefinition(WORLD).make_world()
+    world.output = CollectingSink()
+    session = Session(world, CommandDispatcher(make_command_to_action()))
+    session.start()
+    world.output.take()
+    return session
+
+
+def run(session: Session, command_string: str) -> str:
+    session.run(command_string)
+    return session.world.output.take()
+
+
+def cached(session: Session, command_string: str) -> str:
+    """
+    Output of a command rendered twice, checking that the second time it
+    was read from the render cache.
+    """
+    text = run(session, command_string)
+    entries = dict(render_cache(session.world).entries)
+    assert run(session, command_string) == text
+    assert render_cache(session.world).entries == entries
+    return text
+
+
+def find(world: World, name: str) -> Entity:
+    entity, = lookup_entities(world, name)
+    return entity
+
+
+def test_take(session: Session):
+    assert 'iron key' in cached(session, 'look')
+    assert cached(session, 'i') == 'Your inventory is empty\n'
+    assert 'an iron key' in cached(session, 'x floor')
+
+    run(session, 'take key')
+    assert 'iron key' not in run(session, 'look')
+    assert 'an iron key' in run(session, 'i')
+    assert 'an iron key' not in run(session, 'x floor')
+
+
+def test_drop(session: Session):
+    run(session, 'take key')
+    assert 'iron key' not in cached(session, 'look')
+    assert 'an iron key' in cached(session, 'i')
+
+    run(session, 'drop key')
+    assert 'iron key' in run(session, 'look')
+    assert run(session, 'i') == 'Your inventory is empty\n'
+
+
+def test_put_on(session: Session):
+    run(session, 'take key')
+    assert cached(session, 'x table') == (
+        "It doesn't look like anything to you.\n")
+    assert 'an iron key' in cached(session, 'i')
+
+    run(session, 'put key on table')
+    assert run(session, 'x table') == 'the table contains: an iron key\n'
+    assert run(session, 'i') == 'Your inventory is empty\n'
+    assert 'iron key' not in run(session, 'look')
+
+
+def test_undo(session: Session):
+    run(session, 'take key')
+    run(session, 'put key on table')
+    assert 'an iron key' in cached(session, 'x table')
+    assert cached(session, 'i') == 'Your inventory is empty\n'
+
+    run(session, 'undo')
+    assert 'an iron key' not in run(session, 'x table')
+    assert 'an iron key' in run(session, 'i')
+    run(session, 'undo')
+    assert 'iron key' in run(session, 'look')
+    run(session, 'redo')
+    assert 'iron key' not in run(session, 'look')
+
+
+def test_timed_move(session: Session):
+    world = session.world
+    # Due once the four commands checking the cache have taken their time
+    scheduler_of(world).schedule(5, TakeAction(), [find(world, 'key')])
+    assert 'iron key' in cached(session, 'look')
+    assert cached(session, 'i') == 'Your inventory is empty\n'
+
+    run(session, 'z')
+    assert 'iron key' not in run(session, 'look')
+    assert 'an iron key' in run(session, 'i')
+
+
+def test_timed_move_out_of_scope(session: Session):
+    world = session.world
+    scheduler_of(world).schedule(6, TakeAction(), [find(world, 'key')])
+    assert cached(session, 'i') == 'Your inventory is empty\n'
+
+    run(session, 'e')
+    assert cached(session, 'i') == 'Your inventory is empty\n'
+    run(session, 'z')
+    assert 'an iron key' in run(session, 'i')
+
+
+def test_component_replaced(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    assert 'an iron key' in cached(session, 'look')
+    assert 'an iron key' in cached(session, 'x floor')
+
+    key.add_component(DescriptionComponent(['brass key']))
+    assert 'a brass key' in run(session, 'look')
+    assert 'a brass key' in run(session, 'x floor')
+
+    run(session, 'take key')
+    assert 'a brass key' in cached(session, 'i')
+    key.add_component(DescriptionComponent(['silver key']))
+    assert 'a silver key' in run(session, 'i')
+
+
+def test_component_replaced_out_of_scope(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    run(session, 'take key')
+    run(session, 'e')
+    assert 'an iron key' in cached(session, 'i')
+
+    # The key is in the hall's index, not the cellar's
+    key.add_component(DescriptionComponent(['brass key']))
+    assert 'a brass key' in run(session, 'i')
@@ -0,0 +1,91 @@
+import pytest
+
+from action import TakeAction
+from component import InventoryComponent, OnComponent
+from core import Entity, World
+from main import make_command_to_action, make_world
+from output import CollectingSink
+from roomcache import RoomCache
+from scheduler import scheduler_of
+from session import Session
+from util import CommandDispatcher, lookup_entities
+
+
+@pytest.fixture(name='session')
+def make_session() -> Session:
+    world = make_world()
+    world.output = CollectingSink()
+    session = Session(world, CommandDispatcher(make_command_to_action()))
+    session.start()
+    world.output.take()
+    return session
+
+
+def run(session: Session, command_string: str) -> str:
+    session.run(command_string)
+    return session.world.output.take()
+
+
+def find(world: World, name: str) -> Entity:
+    entity, = lookup_entities(world, name)
+    return entity
+
+
+def test_timed_action_in_scope(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    scheduler_of(world).schedule(1, TakeAction(), [key])
+    assert run(session, 'z') == 'Time passes.\nYou take the iron key\n'
+    assert key in world.items(world.player[InventoryComponent])
+
+
+def test_timed_action_out_of_scope(session: Session):
+    world = session.world
+    plain = world.current_room
+    key = find(world, 'key')
+    floor = find(world, 'floor')
+    scheduler_of(world).schedule(2, TakeAction(), [key])
+
+    run(session, 'e')
+    # The player is elsewhere, so sees nothing happen
+    assert run(session, 'z') == 'Time passes.\n'
+    assert key in world.items(world.player[InventoryComponent])
+    assert key not in world.items(floor[OnComponent])
+    assert world.container_of(key) is world.player
+
+    world.set_room(plain)
+    assert 'iron key' not in run(session, 'look')
+    assert run(session, 'take key') == 'You are already carrying that.\n'
+
+
+def test_timed_action_keeps_room_loaded(session: Session):
+    world = session.world
+    plain = world.current_room
+    RoomCache(world, 0)
+    key = find(world, 'key')
+    floor = find(world, 'floor')
+    timer = scheduler_of(world).schedule(3, TakeAction(), [key])
+
+    # The timer acts on the key, so leaving does not evict its room
+    run(session, 'e')
+    assert plain.loaded
+    run(session, 'z')
+    run(session, 'z')
+    assert not timer.pending
+    # The key has moved, so the room is still not evicted
+    world.set_room(plain)
+    run(session, 'e')
+    assert plain.loaded
+    assert world.items(floor[OnComponent]) == {}
+
+
+def test_undo_reverts_timed_action(session: Session):
+    world = session.world
+    key = find(world, 'key')
+    floor = find(world, 'floor')
+    scheduler_of(world).schedule(2, TakeAction(), [key])
+    run(session, 'e')
+    run(session, 'z')
+    run(session, 'undo')
+    assert key not in world.items(world.player[InventoryComponent])
+    assert world.container_of(key) is floor
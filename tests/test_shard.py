@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from action import WaitAction
+from main import make_command_to_action, make_world
+from scheduler import scheduler_of
+from shard import ShardRouter, ShardWorker, WorkerError
+from util import CommandDispatcher
+from worldgen import WorldShape, generate_world
+
+COMMANDS = [
+    'x shelf 0', 'take book', 'e', 'take key', 'take map', 'z',
+    'put map on chest 0', 'x chest 0', 'go to room 0', 'take desk 2',
+    'x floor', 'i', 'travel 2 steps to room 8', 'look', 'z', 'i'
+]
+
+
+def make_generated_world():
+    return generate_world(WorldShape(rooms=16, entities_per_room=12, seed=1))
+
+
+def make_worker() -> ShardWorker:
+    return ShardWorker(make_generated_world(),
+                       CommandDispatcher(make_command_to_action()))
+
+
+def open_session(worker: ShardWorker):
+    worker.open(0)
+    session, _ = worker.sessions[0]
+    # Timers and the clock migrate with the session
+    scheduler_of(session.world).schedule(3, WaitAction(), period=4)
+
+
+@pytest.mark.parametrize('split', range(len(COMMANDS) + 1))
+def test_migrated_session_plays_on(split: int):
+    reference = make_worker()
+    open_session(reference)
+    expected = [reference.run(0, command) for command in COMMANDS]
+
+    source, destination = make_worker(), make_worker()
+    open_session(source)
+    outputs = [source.run(0, command) for command in COMMANDS[:split]]
+    destination.adopt(0, source.export(0))
+    assert not source.sessions
+    outputs += [destination.run(0, command) for command in COMMANDS[split:]]
+    assert outputs == expected
+
+
+def test_router_migrates_sessions():
+
+    async def play() -> list[str]:
+        router = ShardRouter(make_world, make_command_to_action, 2)
+        router.start()
+        try:
+            await router.open(0)
+            source = router.pins[0]
+            destination, = (worker for worker in router.workers
+                            if worker is not source)
+            outputs = [await router.run(0, 'take key')]
+            await router.migrate(0, destination)
+            assert router.pins[0] is destination
+            assert destination.sessions == {0}
+            outputs.append(await router.run(0, 'i'))
+
+            # Exporting from a dead worker fails, so the session stays put
+            destination.process.kill()
+            await asyncio.get_running_loop().run_in_executor(
+                None, destination.process.join)
+            with pytest.raises(WorkerError):
+                await router.migrate(0, source)
+            assert router.pins[0] is destination
+            return outputs
+        finally:
+            for worker in router.workers:
+                worker.process.kill()
+
+    outputs = asyncio.run(play())
+    assert outputs == [
+        'You take the iron key\n',
+        'Your inventory contains:\n - an iron key\n',
+    ]
+
+
+def test_failed_adoption_returns_session_to_source():
+
+    async def play() -> list[str]:
+        router = ShardRouter(make_world, make_command_to_action, 2)
+        router.start()
+        try:
+            await router.open(0)
+            source = router.pins[0]
+            destination, = (worker for worker in router.workers
+                            if worker is not source)
+            await router.run(0, 'take key')
+
+            destination.process.kill()
+            await asyncio.get_running_loop().run_in_executor(
+                None, destination.process.join)
+            with pytest.raises(WorkerError):
+                await router.migrate(0, destination)
+            assert router.pins[0] is source
+            assert source.sessions == {0}
+            return [await router.run(0, 'i')]
+        finally:
+            for worker in router.workers:
+                worker.process.kill()
+
+    assert asyncio.run(
+        play()) == ['Your inventory contains:\n - an iron key\n']
@@ -0,0 +1,148 @@
+import io
+from pathlib import Path
+
+from component import (DescriptionComponent, InventoryComponent,
+                       LandmarkComponent, OnComponent, PortalComponent,
+                       TakeableComponent, WorldDescriptionComponent)
+from core import Entity, Room, World
+from main import make_world
+from snapshot import (SnapshotReader, load_snapshot, save_snapshot,
+                      write_snapshot)
+from util import Query, lookup_entities
+from worldgen import WorldShape, generate_world
+
+
+def find(world: World, name: str) -> Entity:
+    entity, = lookup_entities(world, name)
+    return entity
+
+
+def names(entities) -> list[str]:
+    return [entity[DescriptionComponent].names[0] for entity in entities]
+
+
+def summary(entity: Entity) -> tuple:
+    description = entity.get(DescriptionComponent)
+    return (entity.signature,
+            None if description is None else description.names)
+
+
+def test_round_trip(tmp_path: Path):
+    world = make_world()
+    plain, darkness = world.rooms
+    key = find(world, 'key')
+    narrator = find(world, 'narrator')
+    floor = find(world, 'floor')
+    world.move_entity(key, world.player, InventoryComponent)
+    world.move_entity(narrator, floor, OnComponent)
+    world.set_room(darkness)
+    path = tmp_path / 'world.snapshot'
+    save_snapshot(world, path)
+
+    loaded = load_snapshot(path)
+    plain, darkness = loaded.rooms
+    assert loaded.current_room is darkness
+    assert not plain.loaded
+
+    # The carried key is saved with the player, so it can be named anywhere
+    key = find(loaded, 'key')
+    assert loaded.items(loaded.player[InventoryComponent]) == {key: None}
+    assert loaded.container_of(key) is loaded.player
+
+    landmarks = {
+        entity[DescriptionComponent].names[0]: entity[LandmarkComponent].room
+        for entity in loaded.global_entities.with_component(LandmarkComponent)
+    }
+    assert landmarks == {'the starting point': plain, 'the darkness': darkness}
+
+    # The floor refers to the narrator, a global entity, by its ID
+    loaded.set_room(plain)
+    floor = find(loaded, 'floor')
+    assert names(loaded.items(floor[OnComponent])) == ['you']
+    assert loaded.container_of(find(loaded, 'narrator')) is floor
+    portal, = Query(loaded).has(PortalComponent).all()
+    assert portal[PortalComponent].room is darkness
+
+
+def test_round_trip_is_lazy(tmp_path: Path):
+    world = generate_world(WorldShape(rooms=9, entities_per_room=10))
+    path = tmp_path / 'world.snapshot'
+    save_snapshot(world, path)
+
+    loaded = load_snapshot(path)
+    assert [room.loaded for room in loaded.rooms] == [True] + [False] * 8
+    loaded.set_room(list(loaded.rooms)[4])
+    description = next(loaded.iter_components(WorldDescriptionComponent))
+    assert description.description.startswith('You are in room 4.')
+    assert [room.loaded for room in loaded.rooms
+            ] == [True, False, False, False, True, False, False, False, False]
+
+
+def test_save_keeps_rooms_unloaded():
+    world = generate_world(WorldShape(rooms=16, entities_per_room=10))
+    rooms = list(world.rooms)
+    rooms[5].materialize()
+    before = [room.loaded for room in rooms]
+
+    file = io.BytesIO()
+    write_snapshot(world, file)
+    assert [room.loaded for room in rooms] == before
+
+
+def test_save_of_loaded_snapshot(tmp_path: Path):
+    world = make_world()
+    key = find(world, 'key')
+    world.move_entity(key, world.player, InventoryComponent)
+    path = tmp_path / 'world.snapshot'
+    save_snapshot(world, path)
+
+    loaded = load_snapshot(path)
+    plain, darkness = loaded.rooms
+    assert not darkness.loaded
+    copy = tmp_path / 'copy.snapshot'
+    save_snapshot(loaded, copy)
+    assert copy.read_bytes() == path.read_bytes()
+    assert plain.loaded and not darkness.loaded
+
+
+def test_evicted_sections_are_forgotten(tmp_path: Path):
+    world = generate_world(WorldShape(rooms=4, entities_per_room=10))
+    path = tmp_path / 'world.snapshot'
+    save_snapshot(world, path)
+
+    reader = SnapshotReader(path)
+    loaded = reader.load_world()
+    resident = len(reader.entities)
+    room: Room = list(loaded.rooms)[3]
+    room.materialize()
+    assert len(reader.entities) == resident + len(room.entities)
+    contents = [summary(entity) for entity in room.entities]
+    room.evict()
+    assert len(reader.entities) == resident
+    room.materialize()
+    assert len(reader.entities) == resident + len(room.entities)
+    assert [summary(entity) for entity in room.entities] == contents
+
+
+def test_moved_entity_saved_with_container(tmp_path: Path):
+    world = generate_world(WorldShape(rooms=4, entities_per_room=10))
+    first, second, *_ = world.rooms
+    item = next(Query(world).has(TakeableComponent).all())
+    world.set_room(second)
+    table = next(Query(world).has(OnComponent).all())
+    world.move_entity(item, table, OnComponent)
+    path = tmp_path / 'world.snapshot'
+    save_snapshot(world, path)
+
+    loaded = load_snapshot(path)
+    first, second, *_ = loaded.rooms
+    table = next(Query(loaded).has(OnComponent).all())
+    item, = [
+        entity for entity in loaded.items(table[OnComponent])
+        if summary(entity) == summary(item)
+    ]
+    assert item in second.entities
+    assert loaded.container_of(item) is table
+    assert not first.loaded
+    first.materialize()
+    assert all(summary(entity) != summary(item) for entity in first.entities)
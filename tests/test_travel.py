@@ -0,0 +1,102 @@
+import pytest
+
+from component import DescriptionComponent, Direction, PortalComponent
+from core import Entity, Room, World
+from roomcache import RoomCache
+from travel import RoomGraph, room_graph
+from worldfile import WorldDefinition
+
+# Rooms a, b and c in a row; only a and b are joined
+WORLD = {
+    'start': 'a',
+    'player': {'description': {'names': ['player']}},
+    'rooms': {
+        'a': [{
+            'description': {'names': ['east door']},
+            'portal': {'room': 'b', 'direction': 'east'},
+        }],
+        'b': [{
+            'description': {'names': ['west door']},
+            'portal': {'room': 'a', 'direction': 'west'},
+        }],
+        'c': [],
+    },
+}
+
+
+@pytest.fixture(name='world')
+def fixture_world() -> World:
+    return WorldDefinition(WORLD).make_world()
+
+
+def add_portal(room: Room, destination: Room, direction: Direction):
+    room.add_entity(
+        Entity([
+            DescriptionComponent([f'{direction.value} door']),
+            PortalComponent(destination, direction),
+        ]))
+
+
+def test_path(world: World):
+    a, b, c = world.rooms
+    graph = room_graph(world)
+    assert graph.path(a, b) == [b]
+    assert graph.path(b, a) == [a]
+    assert graph.path(a, c) is None
+    # Searching does not keep rooms loaded
+    assert not b.loaded and not c.loaded
+
+
+def test_portal_added_in_room_read_unloaded(world: World):
+    a, b, c = world.rooms
+    graph = room_graph(world)
+    assert graph.path(a, c) is None
+
+    world.set_room(b)
+    add_portal(b, c, Direction.E)
+    assert graph.path(a, c) == [b, c]
+
+
+def test_portal_added_in_reloaded_room(world: World):
+    a, b, c = world.rooms
+    RoomCache(world, 0)
+    graph = room_graph(world)
+    world.set_room(b)
+    assert graph.path(a, c) is None
+
+    # Leaving b evicts it, so it is loaded with a new ExitIndex on return
+    world.set_room(a)
+    assert not b.loaded
+    world.set_room(b)
+    add_portal(b, c, Direction.E)
+    assert graph.path(a, c) == [b, c]
+
+
+def test_portal_added_in_loaded_room(world: World):
+    a, b, c = world.rooms
+    graph = room_graph(world)
+    assert graph.path(a, c) is None
+    add_portal(a, c, Direction.N)
+    assert graph.path(a, c) == [c]
+
+
+def test_paths_are_least_recently_used(world: World, monkeypatch):
+    monkeypatch.setattr(RoomGraph, 'max_size', 2)
+    a, b, c = world.rooms
+    graph = room_graph(world)
+    graph.path(a, b)
+    graph.path(a, c)
+    graph.path(a, b)
+    graph.path(b, a)
+    assert list(graph.paths) == [(a, b), (b, a)]
+
+
+def test_graph_follows_every_instance(world: World):
+    a, b, c = world.rooms
+    instance = world.instantiate()
+    assert room_graph(instance) is room_graph(world)
+    assert room_graph(instance).path(a, c) is None
+
+    instance.set_room(b)
+    add_portal(b, c, Direction.E)
+    assert room_graph(world).path(a, c) == [b, c]
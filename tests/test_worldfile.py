@@ -0,0 +1,121 @@
+import copy
+import json
+from pathlib import Path
+
+import pytest
+
+from component import (DescriptionComponent, InventoryComponent,
+                       LandmarkComponent, OnComponent, PortalComponent)
+from main import DEFAULT_WORLD
+from util import Query, lookup_entities
+from worldfile import WorldDefinition, WorldFileError
+
+WORLD = {
+    'start': 'hall',
+    'player': {'inventory': ['lamp'], 'description': {'names': ['player']}},
+    'entities': [
+        {'id': 'lamp', 'description': {'names': ['lamp']}},
+        {'description': {'names': ['cellar']}, 'landmark': 'cellar'},
+    ],
+    'rooms': {
+        'hall': [
+            {'world_description': 'A hall.'},
+            {'id': 'key', 'description': {'names': ['key']}, 'takeable': True},
+            {
+                'description': {'names': ['floor']},
+                'on': ['key'],
+                'floor': True,
+            },
+            {
+                'description': {'names': ['trapdoor']},
+                'portal': {'room': 'cellar', 'direction': 'down'},
+            },
+        ],
+        'cellar': [{'world_description': 'A cellar.'}],
+    },
+}
+
+
+def with_change(change) -> dict:
+    data = copy.deepcopy(WORLD)
+    change(data)
+    return data
+
+
+def test_load_default_world():
+    world = WorldDefinition.load(DEFAULT_WORLD).make_world()
+    plain, darkness = world.rooms
+    assert world.current_room is plain
+    assert not darkness.loaded
+    key, = lookup_entities(world, 'key')
+    floor, = lookup_entities(world, 'floor')
+    assert world.items(floor[OnComponent]) == {key: None}
+
+
+def test_make_world():
+    definition = WorldDefinition(WORLD)
+    world = definition.make_world()
+    hall, cellar = world.rooms
+    lamp, = lookup_entities(world, 'lamp')
+    assert world.items(world.player[InventoryComponent]) == {lamp: None}
+    landmark = next(Query(world).has(LandmarkComponent).all())
+    assert landmark[LandmarkComponent].room is cellar
+    trapdoor = next(Query(world).has(PortalComponent).all())
+    assert trapdoor[PortalComponent].room is cellar
+    assert trapdoor[DescriptionComponent].names == ['trapdoor']
+    assert hall.loaded and not cellar.loaded
+
+    # Every world made from a definition is new
+    other = definition.make_world()
+    assert lookup_entities(other, 'key') != lookup_entities(world, 'key')
+
+
+@pytest.mark.parametrize('change, message', [
+    (lambda data: data.update(version=2), 'unsupported version 2'),
+    (lambda data: data.update(start='attic'), 'start is not a room'),
+    (lambda data: data.pop('player'), 'there is no player'),
+    (lambda data: data.update(entities={}), 'entities must be a list'),
+    (lambda data: data['rooms'].update(attic={}),
+     'room attic must be a list of objects'),
+    (lambda data: data['rooms']['cellar'].append({'colour': 'red'}),
+     'unknown component colour in room cellar'),
+    (lambda data: data['rooms']['cellar'].append({'on': ['key']}),
+     'unknown entity key in on in room cellar'),
+    (lambda data: data['player'].update(inventory=['key']),
+     'unknown entity key in inventory in global entities'),
+    (lambda data: data['entities'][1].update(landmark='attic'),
+     'unknown room attic in landmark in global entities'),
+    (lambda data: data['rooms']['hall'][3]['portal'].pop('room'),
+     'invalid portal in room hall'),
+    (lambda data: data['rooms']['hall'][3]['portal'].update(
+        direction='sideways'), 'invalid portal in room hall'),
+    (lambda data: data['rooms']['cellar'].append({'description': {}}),
+     'invalid description in room cellar'),
+    (lambda data: data['rooms']['cellar'].append(
+        {'description': {'names': 'box'}}),
+     'invalid description in room cellar'),
+    (lambda data: data['rooms']['cellar'].append(
+        {'description': {'names': []}}), 'invalid description in room cellar'),
+    (lambda data: data['rooms']['cellar'][0].update(world_description=None),
+     'invalid world_description in room cellar'),
+    (lambda data: data['rooms']['cellar'].append({'id': 3}),
+     'id 3 in room cellar is not a string'),
+])
+def test_invalid_world(change, message: str):
+    # Rooms are checked up front, not when they are first entered
+    with pytest.raises(WorldFileError) as info:
+        WorldDefinition(with_change(change))
+    assert info.value.message == message
+
+
+def test_invalid_json(tmp_path: Path):
+    path = tmp_path / 'world.json'
+    path.write_text('{"start": ', encoding='utf-8')
+    with pytest.raises(WorldFileError):
+        WorldDefinition.load(path)
+
+
+def test_load(tmp_path: Path):
+    path = tmp_path / 'world.json'
+    path.write_text(json.dumps(WORLD), encoding='utf-8')
+    assert WorldDefinition.load(path).data == WORLD